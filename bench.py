@@ -0,0 +1,692 @@
+"""
+性能基准测试，每个基准输出一组对比数据，不做通过/失败判断（正确性检查在 tests/ 中，用 pytest 运行）
+用法: python bench.py <名称>... 或 python bench.py all，名称见 python bench.py --help
+Qt 相关的基准默认使用 offscreen 平台
+"""
+import argparse
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("QT_LOGGING_RULES", "default.warning=false")# offscreen 平台对不支持的窗口操作（raise、抓取键盘等）每次都会警告
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import Qt, QTimer
+
+from task.lib.proc_utils import terminate_all
+from task.lib.uni_panel.log_buffer import LogRingBuffer
+from task.lib.uni_panel.log_view import LogView
+from task.lib.uni_panel.queue_notifier import QueueNotifier
+
+
+def memory_kb(peak:bool = False) -> int|None:
+    """
+    本进程的常驻内存（peak 为 True 时取峰值），单位 KB
+    Linux 读 /proc/self/status，Windows 用 GetProcessMemoryInfo，其他平台返回 None
+    """
+    if sys.platform.startswith("linux"):
+        field = "VmHWM:" if peak else "VmRSS:"
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith(field))
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                       [(name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                        "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.WinDLL("kernel32")
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        kernel32.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+        if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return (counters.PeakWorkingSetSize if peak else counters.WorkingSetSize) // 1024
+    return None
+
+def reset_peak_memory() -> bool:
+    """把峰值内存重置为当前值，只有 Linux 支持（写 /proc/self/clear_refs）；其他平台返回 False，峰值从进程启动算起"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+def format_mb(kb:int|None) -> str:
+    return "n/a" if kb is None else f"{kb / 1024:+.1f} MB"
+
+def latency_benchmark(mode, count=2000, interval=0.002):
+    """
+    测量消息从工作线程 put 到 GUI 线程取出的端到端延迟，mode 为 "poll"（原 100ms 定时轮询）或 "signal"
+    用法: python bench.py latency
+    """
+    app = QApplication.instance() or QApplication(sys.argv)
+    local_queue = queue.Queue()
+    notifier = QueueNotifier()
+    delays = []
+
+    def drain():
+        notifier.clear()
+        while True:
+            try:
+                sent = local_queue.get_nowait()
+            except queue.Empty:
+                break
+            delays.append(time.perf_counter() - sent)
+        if len(delays) >= count:
+            app.quit()
+
+    def produce():
+        for _ in range(count):
+            local_queue.put(time.perf_counter())
+            if mode == "signal":
+                notifier.notify()
+            time.sleep(interval)
+
+    if mode == "poll":
+        timer = QTimer()
+        timer.setInterval(100)
+        timer.timeout.connect(drain)
+        timer.start()
+    else:
+        notifier.ready.connect(drain, Qt.ConnectionType.QueuedConnection)
+    threading.Thread(target=produce, daemon=True).start()
+    app.exec()
+    delays.sort()
+    p50 = delays[len(delays) // 2] * 1000
+    p99 = delays[int(len(delays) * 0.99)] * 1000
+    print(f"{mode:>6}: p50 {p50:.3f} ms  p99 {p99:.3f} ms  ({len(delays)} messages)")
+
+def bus_benchmark(count=100000):
+    """
+    测量 ProcessManager 消息总线在两个子进程之间的吞吐：A 输出 count 行 [CMD:sink:...]，sink 从 stdin 读完后报告
+    用法: python bench.py bus
+    """
+    from task.lib.uni_panel.process_manager import ProcessManager as BusManager
+    source = f"import sys, time\nfor i in range({count}): sys.stdout.write('[CMD:sink:msg %d]\\n' % i)\nsys.stdout.flush()\ntime.sleep(30)\n"
+    sink = f"import sys\nn = 0\nfor line in sys.stdin:\n    n += 1\n    if n == {count}: print('done', flush=True)\n"
+    manager = BusManager()
+    manager.add_task("sink", ["-c", sink], "python")
+    time.sleep(0.3)
+    start = time.perf_counter()
+    manager.add_task("source", ["-c", source], "python")
+    while True:
+        task_name, stream_name, lines = manager.stdout_queue.get(timeout=60)
+        if task_name == "sink" and "done" in lines:
+            break
+    elapsed = time.perf_counter() - start
+    print(f"bus: {count} messages in {elapsed:.2f} s, {count / elapsed:.0f} msg/s, {manager.bus_stats}")
+    manager.close()
+
+def macro_benchmark(line_count=20000):
+    """
+    测量宏引擎在 1/100/1000 条规则下每秒处理的行数，并与逐条规则匹配对比
+    用法: python bench.py macro
+    """
+    import re
+    from task.lib.uni_panel.hong_manager import MacroEngine
+    lines = [f"2024/01/01 12:00:{i % 60:02d} route.go:{i % 300}: [tcp] 127.0.0.1:{1000 + i % 5000} -> 10.0.{i % 256}.{i % 7}:443 ok" for i in range(line_count)]
+    for rule_count in (1, 100, 1000):
+        engine = MacroEngine()
+        for k in range(rule_count):
+            engine.add_rule(f"rule{k}", rf"token{k}x(?P<value>\d+)", "set_var")
+        start = time.perf_counter()
+        engine.process("bench", "stdout", lines)
+        engine_rate = line_count / (time.perf_counter() - start)
+        patterns = [re.compile(rule.pattern) for rule in engine.rules]
+        start = time.perf_counter()
+        for line in lines:
+            for pattern in patterns:
+                pattern.search(line)
+        naive_rate = line_count / (time.perf_counter() - start)
+        print(f"macro: {rule_count:>4} rules  engine {engine_rate:>10,.0f} lines/s  per-rule loop {naive_rate:>10,.0f} lines/s")
+
+def decode_benchmark():
+    """
+    StreamDecoder 按 4 KB 块解码中文输出的吞吐（随机切分的正确性检查见 tests/test_stream_decoder.py）
+    用法: python bench.py decode
+    """
+    from task.lib.uni_panel.stream_decoder import StreamDecoder
+    text_lines = [f"第{i}行 输出：连接成功 → 耗时 {i * 7 % 1000}ms ✓" if i % 3 else f"line {i} ascii only" for i in range(2000)]
+    payload = ("\n".join(text_lines) + "\n").encode("utf-8") * 50
+    chunks = [payload[i:i + 4096] for i in range(0, len(payload), 4096)]
+    decoder = StreamDecoder()
+    start = time.perf_counter()
+    count = 0
+    for chunk in chunks:
+        count += len(decoder.feed(chunk))
+    elapsed = time.perf_counter() - start
+    print(f"decode: {len(payload) / elapsed / 1e6:.1f} MB/s, {count / elapsed:,.0f} lines/s (4 KB chunks)")
+
+def fernet_case(mode, key, path):
+    """在单独的子进程中测量一个 fernet 用例，输出 耗时(ms) 峰值内存增量(MB) 明文长度 测量方式"""
+    import base64
+    import tracemalloc
+    from cryptography.fernet import Fernet
+    from task.lib.gost_subscribe import SubscriptionCipher
+    key = key.encode()
+    with open(path, "rb") as f:
+        body = f.read()
+    cipher = SubscriptionCipher(key)
+    # 能重置峰值的平台用常驻内存峰值，否则用 tracemalloc 统计 Python 对象的峰值（bytes/str 副本都会计入）
+    use_rss = reset_peak_memory() and memory_kb() is not None
+    if use_rss:
+        base = memory_kb()
+    else:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if mode == "old":
+        result = Fernet(key).decrypt(base64.b64decode(body.decode().encode())).decode()
+    else:
+        result = cipher.decrypt_bytes(body)
+    elapsed = time.perf_counter() - start
+    peak = memory_kb(peak=True) - base if use_rss else tracemalloc.get_traced_memory()[1] / 1024
+    print(f"{elapsed * 1000:.1f} {peak / 1024:.1f} {len(result)} {'rss' if use_rss else 'tracemalloc'}")
+
+def fernet_benchmark():
+    """
+    比较旧的 str 解密路径（b64decode(text.encode()) -> Fernet(key).decrypt -> decode）与 SubscriptionCipher.decrypt_bytes
+    在 100KB ~ 20MB 明文下的耗时和峰值内存；每个用例在单独的子进程中测量
+    （Linux 下用 clear_refs 重置 VmHWM 后取常驻内存峰值增量，其他平台取 tracemalloc 峰值）
+    decrypt_bytes 省掉的是 str 往返的副本，Fernet 内部的副本仍在，大明文下两者的峰值相近
+    用法: python bench.py fernet
+    """
+    import base64
+    import tempfile
+    from cryptography.fernet import Fernet
+    key = Fernet.generate_key()
+    path = os.path.join(tempfile.mkdtemp(), "payload")
+    for size in (100 * 1024, 1024 * 1024, 5 * 1024 * 1024, 20 * 1024 * 1024):
+        with open(path, "wb") as f:
+            f.write(base64.b64encode(Fernet(key).encrypt(b"- name: node\n" * (size // 13))))
+        row = []
+        for mode in ("old", "new"):
+            output = subprocess.run([sys.executable, __file__, "--fernet-case", mode, key.decode(), path], capture_output=True, text=True, check=True).stdout.split()
+            row.append(f"{mode} {float(output[0]):8.1f} ms  peak +{float(output[1]):6.1f} MB")
+        print(f"fernet: {size / 1024 / 1024:6.2f} MB  " + "   ".join(row) + f"  ({output[3]})")
+
+def paint_benchmark(frames=60, width=1920, height=1080):
+    """
+    测量休息图片窗口每帧的绘制耗时（offscreen 平台）：
+    旧实现每次 paintEvent 都重新读取、缩放、伽马校正整张图片，现在只绘制缓存的 QPixmap
+    用法: python bench.py paint
+    """
+    import tempfile
+    from PIL import Image
+    from PySide6.QtGui import QPainter, QPixmap
+    app = QApplication.instance() or QApplication(sys.argv)
+    from task.lib.eye_care import eye_care
+    path = os.path.join(tempfile.mkdtemp(), "rest.png")
+    Image.effect_mandelbrot((2560, 1440), (-2.2, -1.2, 1.0, 1.2), 64).convert("RGB").save(path)
+    config = dict(eye_care.DEFAULT_CONFIG, image_path=path, edge_fade_width=0.0)
+    manager = eye_care.RestOverlayManager(config)
+    overlay = next(iter(manager.overlays.values()))
+    overlay.setGeometry(0, 0, width, height)
+    overlay.show()
+    overlay.repaint()# 第一次绘制提交后台渲染
+    deadline = time.monotonic() + 30
+    while overlay.cache_key != overlay.current_cache_key() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.005)
+    assert overlay.cached_pixmap is not None, "render did not finish"
+    start = time.perf_counter()
+    for _ in range(frames):
+        overlay.repaint()
+    cached = (time.perf_counter() - start) / frames * 1000
+    # 旧实现：每帧都完整处理一次图片再绘制
+    target = QPixmap(width, height)
+    uncached_frames = max(1, frames // 10)
+    start = time.perf_counter()
+    for _ in range(uncached_frames):
+        image = eye_care.render_rest_image(path, width, height, config["rest_image_gamma"])
+        painter = QPainter(target)
+        painter.drawPixmap(0, 0, QPixmap.fromImage(image))
+        painter.end()
+    uncached = (time.perf_counter() - start) / uncached_frames * 1000
+    print(f"paint: {width}x{height}  per-frame re-render {uncached:.1f} ms  cached pixmap {cached:.3f} ms  ({uncached / cached:.0f}x)")
+    overlay.hide()
+    assert overlay.cached_pixmap is None# 隐藏后释放缓存
+    manager.close()
+
+def mask_benchmark(repeat=5, fade_width=0.15, fade_curve=1.5):
+    """
+    测量边缘渐隐蒙版在 1080p / 1440p / 4K 下的生成耗时，以及同一尺寸再次取用（缓存命中）的耗时
+    用法: python bench.py mask
+    """
+    from task.lib.eye_care import eye_care
+    for width, height in ((1920, 1080), (2560, 1440), (3840, 2160)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            eye_care.build_edge_fade_mask.cache_clear()
+            mask = eye_care.build_edge_fade_mask(width, height, fade_width, fade_curve)
+        build = (time.perf_counter() - start) / repeat * 1000
+        start = time.perf_counter()
+        eye_care.build_edge_fade_mask(width, height, fade_width, fade_curve)
+        cached = (time.perf_counter() - start) * 1000
+        assert mask.size == (width, height)
+        assert mask.getpixel((0, 0)) == 0 and mask.getpixel((width // 2, height // 2)) == 255
+        print(f"mask: {width}x{height}  build {build:6.1f} ms  cached {cached:.3f} ms")
+
+def scale_benchmark(count=1000):
+    """
+    1000 次滚轮缩放事件的总耗时（offscreen 平台）：现在只替换缓存的 QFont，
+    对比旧实现每次缩放都重新格式化 QSS 并 setStyleSheet（触发整个样式重新解析和 polish）
+    用法: python bench.py scale
+    """
+    from PySide6.QtCore import QPoint, QPointF
+    from PySide6.QtGui import QWheelEvent
+    app = QApplication.instance() or QApplication(sys.argv)
+    from task.lib.eye_care import eye_care
+    sys.stdin = None# 不启动读取 stdin 的 IPC 监听线程
+    widget = eye_care.EyeCareTimerWidget({})
+    widget.show()
+    def wheel(i):
+        step = 120 if (i // 10) % 2 == 0 else -120# 放大 10 次、缩小 10 次交替
+        return QWheelEvent(QPointF(5, 5), QPointF(5, 5), QPoint(0, 0), QPoint(0, step),
+                           Qt.MouseButton.NoButton, Qt.KeyboardModifier.NoModifier, Qt.ScrollPhase.NoScrollPhase, False)
+    start = time.perf_counter()
+    for i in range(count):
+        widget.wheelEvent(wheel(i))
+        app.processEvents()
+    cached = (time.perf_counter() - start) * 1000
+    # 旧实现：同样的缩放序列，每次 resize 后重新设置样式表
+    theme = eye_care.THEMES[widget.config["theme"]]
+    font_family = widget.config["font_family"] or theme["font_family"]
+    scale = 1.0
+    start = time.perf_counter()
+    for i in range(count):
+        scale = max(0.5, min(3.0, scale * (1.1 if (i // 10) % 2 == 0 else 0.9)))
+        widget.resize(int(widget.base_config["window_width"] * scale), int(widget.base_config["window_height"] * scale))
+        widget.time_label.setStyleSheet(f"color: {theme['text'].name()}; font-size: {int(14 * scale)}px; "
+                                        f"{theme.get('text_style', 'font-weight: normal;')} font-family: '{font_family}';")
+        app.processEvents()
+    stylesheet = (time.perf_counter() - start) * 1000
+    print(f"scale: {count} wheel events  setStyleSheet per event {stylesheet:.1f} ms  cached font/palette {cached:.1f} ms")
+    widget.rest_overlay.close()
+
+def ipc_benchmark(count=500):
+    """
+    在 offscreen 平台下启动护眼子进程，测量 JSON IPC 请求/回复的往返延迟（行模式与 4 字节长度前缀分帧），
+    同时校验行模式下 stdout 只有协议消息
+    用法: python bench.py ipc
+    """
+    import json
+    import struct
+    import tempfile
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "task", "lib", "eye_care", "eye_care.py")
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    for framing in ("line", "length"):
+        config_path = os.path.join(tempfile.mkdtemp(), "eye_care.json")
+        with open(config_path, "w", encoding="utf-8") as f:
+            json.dump({"ipc_framing": framing}, f)
+        child = subprocess.Popen([sys.executable, script, "--config", config_path], env=env,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        def send(message):
+            data = json.dumps(message).encode("utf-8")
+            child.stdin.write(struct.pack(">I", len(data)) + data if framing == "length" else data + b"\n")
+            child.stdin.flush()
+        def receive():
+            while True:
+                if framing == "length":
+                    size = struct.unpack(">I", child.stdout.read(4))[0]
+                    message = json.loads(child.stdout.read(size))
+                else:
+                    line = child.stdout.readline()
+                    assert line.startswith(b"{"), line# 日志走 stderr，stdout 每行都是 JSON
+                    message = json.loads(line)
+                if message.get("type") != "event":
+                    return message
+        send({"id": 0, "method": "get_state"})
+        assert receive()["result"]["state"] == "work"# 子进程启动完成
+        send({"id": 1, "method": "set_config", "params": [1]})
+        assert receive()["error"]["code"] == "invalid_params"
+        delays = []
+        for i in range(count):
+            start = time.perf_counter()
+            send({"id": i, "method": "get_state"})
+            assert receive()["id"] == i
+            delays.append(time.perf_counter() - start)
+        child.kill()
+        child.wait()
+        delays.sort()
+        print(f"ipc: {framing:>6} framing  p50 {delays[count // 2] * 1000:.3f} ms  p99 {delays[int(count * 0.99)] * 1000:.3f} ms  ({count} round trips)")
+
+def supervisor_benchmark(count=200, lines=50, interval=0.02):
+    """
+    200 个持续输出的子进程：比较 ProcessManager（一个 asyncio 事件循环读取全部管道）
+    与每个流一个读线程的旧设计的线程数、本进程 CPU 耗时和行延迟（子进程写入时刻到消费者取出）
+    子进程全部启动后才同时开始输出（等待标记文件出现），消费者在启动子进程之前就开始取数据
+    用法: python bench.py supervisor
+    """
+    import tempfile
+    from task.lib.uni_panel.process_manager import ProcessManager as Supervisor
+    go = os.path.join(tempfile.mkdtemp(), "go")
+    chatty = (f"import os, time\nwhile not os.path.exists({go!r}): time.sleep(0.05)\n"
+              f"for i in range({lines}):\n    print(time.perf_counter_ns(), flush=True)\n    time.sleep({interval})\n")
+    total = count * lines
+
+    def measure(name, spawn, get):
+        delays, threads = [], [0]
+        started = threading.Event()
+        def consume():
+            while len(delays) < total:
+                try:
+                    batch = get()
+                except queue.Empty:
+                    if started.is_set():
+                        break
+                    continue
+                now = time.perf_counter_ns()
+                delays.extend(now - int(line) for line in batch if line.strip().isdigit())
+                threads[0] = max(threads[0], threading.active_count())
+        start_cpu = time.process_time()
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        spawn()
+        threads[0] = threading.active_count()
+        with open(go, "w"):
+            pass
+        started.set()
+        consumer.join()
+        os.remove(go)
+        delays.sort()
+        print(f"supervisor: {name:>17}  threads {threads[0]:>4}  cpu {time.process_time() - start_cpu:6.2f} s  "
+              f"latency p50 {delays[len(delays) // 2] / 1e6:6.2f} ms  p99 {delays[int(len(delays) * 0.99)] / 1e6:6.2f} ms  ({len(delays)}/{total} lines)")
+
+    manager = Supervisor()
+    def spawn_tasks():
+        for i in range(count):
+            manager.add_task(f"chatty{i}", ["-c", chatty], "python")
+    measure("ProcessManager", spawn_tasks, lambda: manager.stdout_queue.get(timeout=5)[2])
+    manager.close()
+
+    output = queue.Queue()
+    processes = []
+    def reader(stream):
+        for line in iter(stream.readline, b""):
+            output.put([line])
+    def spawn_readers():
+        for i in range(count):
+            process = subprocess.Popen([sys.executable, "-c", chatty], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            processes.append(process)
+            for stream in (process.stdout, process.stderr):
+                threading.Thread(target=reader, args=(stream,), daemon=True).start()
+    measure("thread-per-stream", spawn_readers, lambda: output.get(timeout=5))
+    terminate_all(processes)
+
+def queue_benchmark(total=500000, batch_lines=256):
+    """
+    1 到 50 个生产者线程向输出队列写入共 total 行，比较旧的每行一次 queue.Queue.put
+    与 BatchQueue 按批写入（block / drop-oldest 两种溢出策略）的吞吐（行/秒，含被丢弃的行），并输出队列计数器
+    用法: python bench.py queue
+    """
+    from task.lib.uni_panel.process_manager import BatchQueue
+    line = "2024/01/01 12:00:00 route.go:142: [tcp] 127.0.0.1:1114 <-> 10.0.0.1:443 ok"
+
+    def run(producers, put, get, count_lines):
+        per_producer = total // producers
+        def produce(index):
+            put(index, per_producer)
+        threads = [threading.Thread(target=produce, args=(i,)) for i in range(producers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        received = 0
+        while True:
+            try:
+                received += count_lines(get())
+            except queue.Empty:
+                if not any(thread.is_alive() for thread in threads):
+                    break# drop-oldest 丢掉的行不会到达
+        return received, (time.perf_counter() - start)
+
+    for producers in (1, 5, 10, 25, 50):
+        row = []
+        plain = queue.Queue()
+        def put_lines(index, count):
+            item = (f"task{index}", "stdout", line)
+            for _ in range(count):
+                plain.put(item)
+        received, elapsed = run(producers, put_lines, lambda: plain.get(timeout=0.01), lambda item: 1)
+        row.append(f"Queue per-line {received / elapsed:>9,.0f}")
+        for overflow in ("block", "drop-oldest"):
+            batches = BatchQueue(256, overflow)
+            def put_batches(index, count):
+                name = f"task{index}"
+                for offset in range(0, count, batch_lines):
+                    batches.put((name, "stdout", [line] * min(batch_lines, count - offset)))
+            received, elapsed = run(producers, put_batches, lambda: batches.get(timeout=0.01), lambda item: len(item[2]))
+            stats = batches.stats()
+            assert received + stats["dropped_lines"] == total // producers * producers
+            row.append(f"{overflow} {total / elapsed:>12,.0f} (max depth {stats['max_depth']}, dropped {stats['dropped_lines']})")
+        print(f"queue: {producers:>2} producers  " + "  ".join(row) + "  lines/s")
+
+def log_buffer_benchmark(total=10_000_000, chunk=1000):
+    """
+    向默认容量的 LogRingBuffer 写入 1000 万行，记录 RSS 随写入行数的变化（应保持不变）、追加速度，
+    以及写满后 tail(1000) 和子串搜索的耗时
+    用法: python bench.py logbuf
+    """
+    template = "2024/01/01 12:00:00 route.go:142: [tcp] 127.0.0.1:1114 <-> 10.0.{}.{}:443 connection {}"
+    lines = [template.format(i % 256, i % 7, i) for i in range(chunk)]
+    base = memory_kb()
+    log = LogRingBuffer()
+    start = time.perf_counter()
+    checkpoints = {total // 100, total // 10, total}
+    for written in range(chunk, total + 1, chunk):
+        log.extend(lines)
+        if written in checkpoints:
+            growth = None if base is None else memory_kb() - base
+            print(f"logbuf: {written:>10,} lines  RSS {format_mb(growth)}  buffer {len(log):,} lines")
+    elapsed = time.perf_counter() - start
+    print(f"logbuf: append {total / elapsed:,.0f} lines/s")
+    start = time.perf_counter()
+    tail = log.tail(1000)
+    tail_ms = (time.perf_counter() - start) * 1000
+    assert len(tail) == 1000 and tail[-1] == lines[-1]
+    start = time.perf_counter()
+    hits = log.search("connection 999")
+    search_ms = (time.perf_counter() - start) * 1000
+    assert hits
+    print(f"logbuf: tail(1000) {tail_ms:.3f} ms  search over {len(log):,} lines {search_ms:.1f} ms ({len(hits)} hits)")
+
+def scroll_benchmark(rate=50000, seconds=3.0):
+    """
+    offscreen 平台下以每秒 rate 行的速度向日志写入（生产者线程写 LogRingBuffer，经 QueueNotifier 通知界面），
+    测量 LogView 每秒输出占用的 GUI 线程时间、每秒刷新次数，并校验自动滚动停在底部；
+    对比 QTextBrowser.append 吸收同样数量的行所需的 GUI 线程时间
+    用法: python bench.py scroll
+    """
+    from PySide6.QtWidgets import QTextBrowser
+    app = QApplication.instance() or QApplication(sys.argv)
+    template = "2024/01/01 12:00:00 route.go:142: [tcp] 127.0.0.1:1114 <-> 10.0.0.1:443 connection %d"
+
+    class TimedLogView(LogView):
+        busy = 0.0
+        refreshes = 0
+        def refresh(self):
+            start = time.perf_counter()
+            super().refresh()
+            self.busy += time.perf_counter() - start
+            self.refreshes += 1
+        def paintEvent(self, event):
+            start = time.perf_counter()
+            super().paintEvent(event)
+            self.busy += time.perf_counter() - start
+
+    log = LogRingBuffer()
+    view = TimedLogView(log)
+    view.resize(800, 600)
+    view.show()
+    app.processEvents()
+    view.busy, view.refreshes = 0.0, 0
+    notifier = QueueNotifier()
+    def on_ready():
+        notifier.clear()
+        view.notify_appended()
+    notifier.ready.connect(on_ready, Qt.ConnectionType.QueuedConnection)
+    stop = threading.Event()
+    written = [0]
+    def produce():
+        batch = rate // 100
+        next_tick = time.perf_counter()
+        while not stop.is_set():
+            log.extend([template % (written[0] + i) for i in range(batch)])
+            written[0] += batch
+            notifier.notify()
+            next_tick += 0.01
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+    producer = threading.Thread(target=produce)
+    producer.start()
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec()
+    stop.set()
+    producer.join()
+    view.refresh()
+    scroll_bar = view.verticalScrollBar()
+    assert view.follow and scroll_bar.value() == scroll_bar.maximum()
+    assert log.tail(1)[0] == template % (written[0] - 1)
+    print(f"scroll: LogView {written[0] / seconds:,.0f} lines/s  GUI thread {view.busy / seconds * 1000:.1f} ms per second of output  "
+          f"{view.refreshes / seconds:.0f} refreshes/s  auto-scroll ok")
+
+    browser = QTextBrowser()
+    browser.resize(800, 600)
+    browser.show()
+    lines = [template % i for i in range(rate // 2)]
+    start = time.perf_counter()
+    for line in lines:
+        browser.append(line)
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    print(f"scroll: QTextBrowser.append {len(lines):,} lines took {elapsed * 1000:.0f} ms, "
+          f"{elapsed / (len(lines) / rate) * 1000:.0f} ms GUI time per second of output")
+
+def concurrent_fetch_benchmark(delay=1.0):
+    """
+    本地 HTTP 服务为每个地址加上人为延迟，比较 renew_cfg 并发获取与逐个获取的耗时；
+    同时校验失败重试、超时的地址被放弃（被放弃的下载线程不会再解密写盘）以及整轮截止时间
+    用法: python bench.py fetch
+    """
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from threading import Event
+    import requests
+    from task.lib.gost_subscribe import gost_subscribe
+    content = {"body": b""}
+    hits = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def log_message(self, *args):
+            pass
+        def do_GET(self):
+            name = self.path.strip("/")
+            hits[name] = hits.get(name, 0) + 1
+            if name.startswith("slow"):
+                time.sleep(delay)
+            elif name == "flaky" and hits[name] == 1:
+                self.send_response(500)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            elif name == "hung":
+                time.sleep(30)
+            body = content["body"]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                if name == "late" and hits[name] == 1:
+                    # 第一次慢慢发送正文：每段间隔小于读超时，整体超过单次超时，协程放弃后这次下载仍会成功完成
+                    for offset in range(0, len(body), len(body) // 5 + 1):
+                        self.wfile.write(body[offset:offset + len(body) // 5 + 1])
+                        self.wfile.flush()
+                        time.sleep(delay * 0.3)
+                else:
+                    self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass# 客户端已放弃
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    folder = tempfile.mkdtemp()
+    def endpoint(name, **options):
+        return {"name": name, "url": f"{base}/{name}", "path": os.path.join(folder, name), "encoding": "utf-8", **options}
+    endpoints = [endpoint(f"slow{i}") for i in range(4)] + [
+        endpoint("flaky", backoff=0.2),
+        endpoint("late", timeout=delay, retries=1, backoff=0.1),
+        endpoint("hung", timeout=delay * 1.5, retries=1, backoff=0.1),
+    ]
+    manager = gost_subscribe(endpoints=endpoints)
+    messages = []
+    manager.msg_out = messages.append
+    content["body"] = manager.hard_encrypt("a=1\n", manager.key).encode()
+    decrypts = [0]
+    decrypt_bytes = manager.cipher.decrypt_bytes
+    def counting_decrypt(data):
+        decrypts[0] += 1
+        return decrypt_bytes(data)
+    manager.cipher.decrypt_bytes = counting_decrypt
+
+    start = time.perf_counter()
+    manager.renew_cfg(Event(), [""])
+    concurrent = time.perf_counter() - start
+    time.sleep(delay)# 等被放弃的 late 第一次下载完成，它的结果必须被丢弃
+    failed = [message for message in messages if "更新失败" in message]
+    assert len(failed) == 1 and "hung" in failed[0], failed
+    assert decrypts[0] == 6, decrypts[0]# 只有成功的 6 个地址各解密一次
+    start = time.perf_counter()
+    for item in endpoints[:4]:
+        requests.get(item["url"])
+    serial = time.perf_counter() - start
+    print(f"fetch: {len(endpoints)} endpoints concurrently in {concurrent:.2f} s (slowest endpoint gives up after ~{delay * 3 + 0.1:.1f} s); "
+          f"4 x {delay:.1f} s endpoints one by one {serial:.2f} s")
+    manager.fetch_deadline = delay / 2
+    manager.fetcher.validators.clear()
+    start = time.perf_counter()
+    manager.renew_cfg(Event(), [""])
+    print(f"fetch: fetch_deadline {manager.fetch_deadline:.1f} s cut the cycle off after {time.perf_counter() - start:.2f} s")
+    server.shutdown()
+
+BENCHMARKS = {
+    "latency": lambda: (latency_benchmark("poll"), latency_benchmark("signal")),
+    "bus": bus_benchmark,
+    "macro": macro_benchmark,
+    "decode": decode_benchmark,
+    "fernet": fernet_benchmark,
+    "paint": paint_benchmark,
+    "mask": mask_benchmark,
+    "scale": scale_benchmark,
+    "ipc": ipc_benchmark,
+    "supervisor": supervisor_benchmark,
+    "queue": queue_benchmark,
+    "logbuf": log_buffer_benchmark,
+    "scroll": scroll_benchmark,
+    "fetch": concurrent_fetch_benchmark,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="性能基准测试")
+    parser.add_argument("names", nargs="*", metavar="name", help="要运行的基准：" + " / ".join(BENCHMARKS) + "，all 运行全部")
+    parser.add_argument("--fernet-case", nargs=3, metavar=("MODE", "KEY", "PATH"), help=argparse.SUPPRESS)# fernet 基准在子进程中测量单个用例
+    args = parser.parse_args(argv)
+    if args.fernet_case:
+        fernet_case(*args.fernet_case)
+        return
+    unknown = [name for name in args.names if name not in BENCHMARKS and name != "all"]
+    if unknown or not args.names:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}" if unknown else "no benchmark given")
+    for name in (BENCHMARKS if "all" in args.names else args.names):
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,28 @@
+import time
+STARTUP_T0 = time.perf_counter()
+import os
 import sys
 import json
 import io
+import math
+import queue
+import struct
+import threading
+import argparse
+from collections.abc import Mapping
+from functools import lru_cache
+STARTUP_T_STDLIB = time.perf_counter()
 from PySide6.QtWidgets import (
     QApplication, QWidget, QLabel, QHBoxLayout, QMenu,
     QSystemTrayIcon, QStyle
 )
-from PySide6.QtCore import Qt, QTimer, QPoint, QRectF, Signal, QThread, QPropertyAnimation, QEasingCurve, QBuffer, QRect
+from PySide6.QtCore import Qt, QEvent, QObject, QTimer, QFileSystemWatcher, QPoint, Signal, QThread, QThreadPool, QPropertyAnimation, QEasingCurve
 from PySide6.QtGui import (
-    QPainter, QColor, QAction, QPixmap, QGuiApplication,
-    QIcon, QBrush, QPen, QFont, QImage, QRegion
+    QPainter, QColor, QAction, QActionGroup, QPixmap, QGuiApplication,
+    QBrush, QPen, QFont, QImage, QPalette
 )
-from PIL import Image
+# PIL 只在第一次渲染休息图片时才导入（见 render_rest_image），未配置图片时不付出导入开销
+STARTUP_T_QT = time.perf_counter()
 
 # ====================================================================
 # 全局常量
@@ -18,71 +30,115 @@ from PIL import Image
 AVAILABLE_FONTS = ["Segoe UI", "Arial", "Verdana", "Tahoma", "Trebuchet MS", "Georgia"]
 
 # ====================================================================
-# 主题定义
+# 主题定义（颜色以字符串或 RGBA 元组描述，首次使用某个主题时才创建 QColor）
 # ====================================================================
-THEMES = {
+THEME_SPECS = {
     "Dark": {
-        "background_normal": QColor(0, 0, 0, 180),
-        "background_locked": QColor(0, 0, 0, 50),
-        "text": QColor("white"),
+        "background_normal": (0, 0, 0, 180),
+        "background_locked": (0, 0, 0, 50),
+        "text": "white",
         "text_style": "font-weight: normal;",
         "font_family": "Segoe UI",
-        "icon": QColor("#E0E0E0"),
-        "icon_locked": QColor("white"),
-        "menu_background": QColor("#2E2E2E"),
-        "menu_text": QColor("#F0F0F0"),
-        "menu_border": QColor("#424242"),
-        "menu_selected_background": QColor("#505050"),
-        "menu_separator": QColor("#424242"),
-        "menu_disabled_text": QColor("#707070"),
+        "icon": "#E0E0E0",
+        "icon_locked": "white",
+        "menu_background": "#2E2E2E",
+        "menu_text": "#F0F0F0",
+        "menu_border": "#424242",
+        "menu_selected_background": "#505050",
+        "menu_separator": "#424242",
+        "menu_disabled_text": "#707070",
     },
     "Light": {
-        "background_normal": QColor(255, 255, 255, 200),
-        "background_locked": QColor(255, 255, 255, 80),
-        "text": QColor("black"),
+        "background_normal": (255, 255, 255, 200),
+        "background_locked": (255, 255, 255, 80),
+        "text": "black",
         "text_style": "font-weight: normal;",
         "font_family": "Segoe UI",
-        "icon": QColor("#333333"),
-        "icon_locked": QColor("black"),
-        "menu_background": QColor("#FFFFFF"),
-        "menu_text": QColor("#000000"),
-        "menu_border": QColor("#E0E0E0"),
-        "menu_selected_background": QColor("#F0F0F0"),
-        "menu_separator": QColor("#E0E0E0"),
-        "menu_disabled_text": QColor("#A0A0A0"),
+        "icon": "#333333",
+        "icon_locked": "black",
+        "menu_background": "#FFFFFF",
+        "menu_text": "#000000",
+        "menu_border": "#E0E0E0",
+        "menu_selected_background": "#F0F0F0",
+        "menu_separator": "#E0E0E0",
+        "menu_disabled_text": "#A0A0A0",
     },
     "Aqua": {
-        "background_normal": QColor(10, 132, 143, 210),
-        "background_locked": QColor(10, 132, 143, 80),
-        "text": QColor("white"),
+        "background_normal": (10, 132, 143, 210),
+        "background_locked": (10, 132, 143, 80),
+        "text": "white",
         "text_style": "font-weight: normal;",
         "font_family": "Verdana",
-        "icon": QColor("#C8F0F0"),
-        "icon_locked": QColor("white"),
-        "menu_background": QColor("#0A6B74"),
-        "menu_text": QColor("#FFFFFF"),
-        "menu_border": QColor("#0F8A97"),
-        "menu_selected_background": QColor("#13A2B1"),
-        "menu_separator": QColor("#0F8A97"),
-        "menu_disabled_text": QColor("#88C5CA"),
+        "icon": "#C8F0F0",
+        "icon_locked": "white",
+        "menu_background": "#0A6B74",
+        "menu_text": "#FFFFFF",
+        "menu_border": "#0F8A97",
+        "menu_selected_background": "#13A2B1",
+        "menu_separator": "#0F8A97",
+        "menu_disabled_text": "#88C5CA",
     },
     "Minimal": {
-        "background_normal": QColor(0, 0, 0, 1),
-        "background_locked": QColor(0, 0, 0, 1),
-        "text": QColor("white"),
+        "background_normal": (0, 0, 0, 1),
+        "background_locked": (0, 0, 0, 1),
+        "text": "white",
         "text_style": "font-weight: bold;",
         "font_family": "Arial",
-        "icon": QColor("#E0E0E0"),
-        "icon_locked": QColor("white"),
-        "menu_background": QColor("#2E2E2E"),
-        "menu_text": QColor("#F0F0F0"),
-        "menu_border": QColor("#424242"),
-        "menu_selected_background": QColor("#505050"),
-        "menu_separator": QColor("#424242"),
-        "menu_disabled_text": QColor("#707070"),
+        "icon": "#E0E0E0",
+        "icon_locked": "white",
+        "menu_background": "#2E2E2E",
+        "menu_text": "#F0F0F0",
+        "menu_border": "#424242",
+        "menu_selected_background": "#505050",
+        "menu_separator": "#424242",
+        "menu_disabled_text": "#707070",
     }
 }
 
+class ThemeRegistry(Mapping):
+    """按需构建主题：THEMES[name] 第一次访问时才把颜色描述转换为 QColor，之后复用"""
+    def __init__(self, specs):
+        self.specs = specs
+        self.built = {}
+
+    def __getitem__(self, name):
+        if name not in self.built:
+            theme = {}
+            for key, value in self.specs[name].items():
+                if key in ("text_style", "font_family"):
+                    theme[key] = value
+                else:
+                    theme[key] = QColor(*value) if isinstance(value, tuple) else QColor(value)
+            self.built[name] = theme
+        return self.built[name]
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self):
+        return len(self.specs)
+
+THEMES = ThemeRegistry(THEME_SPECS)
+
+# ====================================================================
+# 主题预编译：调色板与字体对象按需创建并缓存，缩放时只替换对象，不重新解析样式表
+# ====================================================================
+BASE_FONT_SIZE = 14
+
+@lru_cache(maxsize=None)
+def theme_palette(name):
+    palette = QPalette()
+    palette.setColor(QPalette.ColorRole.WindowText, THEMES[name]["text"])
+    return palette
+
+@lru_cache(maxsize=128)
+def scaled_font(family, pixel_size, bold):
+    """字号已量化为整数像素，同一 (字体, 字号, 粗细) 只创建一次 QFont"""
+    font = QFont(family)
+    font.setPixelSize(pixel_size)
+    font.setBold(bold)
+    return font
+
 # ====================================================================
 # 默认配置
 # ====================================================================
@@ -97,20 +153,154 @@ DEFAULT_CONFIG = {
     "rest_image_opacity": 0.8,
     "fade_duration": 1000,
     "rest_image_gamma": 1.5,
+    "rest_prefetch_seconds": 10, # 工作结束前多少秒开始在后台预渲染休息图片
+    "edge_fade_width": 0.15, # 边缘渐隐宽度，占屏幕短边的比例，0 为关闭
+    "edge_fade_curve": 1.5, # 渐隐曲线指数，越大边缘越快变透明
+    "max_timer_sleep": 60, # 隐藏时计时器最长的单次休眠秒数，用于系统休眠唤醒后重新对时
+    "ipc_framing": "line", # IPC 分帧方式："line" 每行一个 JSON，"length" 4 字节大端长度前缀 + JSON
+    "config_path": None, # JSON 配置文件路径，设置后监听文件变化并热重载
 }
 
+# 热重载时各配置项影响的部分
+IMAGE_CONFIG_KEYS = ("image_path", "rest_image_gamma", "edge_fade_width", "edge_fade_curve")
+ANIMATION_CONFIG_KEYS = ("fade_duration", "rest_image_opacity")
+GEOMETRY_CONFIG_KEYS = ("window_width", "window_height")
+SCHEDULE_CONFIG_KEYS = ("rest_prefetch_seconds", "max_timer_sleep")
+STARTUP_ONLY_CONFIG_KEYS = ("ipc_framing", "config_path")
+
 # ====================================================================
-# 热重载监听线程
+# 基于单调时钟的倒计时
+# ====================================================================
+# 优先使用包含系统休眠时间的 CLOCK_BOOTTIME（Linux），休眠唤醒后倒计时不会被“冻结”
+if hasattr(time, "CLOCK_BOOTTIME"):
+    def monotonic_clock():
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+else:
+    monotonic_clock = time.monotonic
+
+class PhaseCountdown:
+    """记录当前阶段的绝对截止时间，剩余时间总是由时钟现算，不会因唤醒延迟累积误差"""
+    def __init__(self, clock=monotonic_clock):
+        self.clock = clock
+        self.deadline = clock()
+        self.paused_remaining = None
+
+    @property
+    def is_paused(self):
+        return self.paused_remaining is not None
+
+    def start(self, seconds):
+        self.deadline = self.clock() + seconds
+        if self.is_paused:
+            self.paused_remaining = seconds
+
+    def remaining(self):
+        if self.is_paused:
+            return self.paused_remaining
+        return max(0.0, self.deadline - self.clock())
+
+    def pause(self):
+        if not self.is_paused:
+            self.paused_remaining = self.remaining()
+
+    def resume(self):
+        if self.is_paused:
+            self.deadline = self.clock() + self.paused_remaining
+            self.paused_remaining = None
+
+# ====================================================================
+# IPC 协议
+# 请求: {"id": 1, "method": "get_state", "params": {...}}
+# 回复: {"id": 1, "type": "result", "result": ...} 或 {"id": 1, "type": "error", "error": {"code": ..., "message": ...}}
+# 事件: {"type": "event", "event": "state", "data": {...}}，仅在订阅后且状态变化时推送
+# 旧格式 {"command": ..., "value": ...} 仍然兼容
 # ====================================================================
 class CommandListenerThread(QThread):
     commandReceived = Signal(str)
+    def __init__(self, parent=None, framing="line"):
+        super().__init__(parent)
+        self.framing = framing
+
     def run(self):
         print("[IPC Listener]: Command listener started.", flush=True)
+        if self.framing == "length":
+            stream = sys.stdin.buffer
+            while True:
+                header = stream.read(4)
+                if len(header) < 4:
+                    break
+                payload = stream.read(struct.unpack(">I", header)[0])
+                self.commandReceived.emit(payload.decode("utf-8"))
+            return
         for line in sys.stdin:
             command = line.strip()
             if command:
                 self.commandReceived.emit(command)
 
+protocol_stream = None # reserve_stdout() 保留的原 stdout 二进制流
+
+def reserve_stdout():
+    """
+    把 stdout 只留给协议消息（行模式的 JSON 回复或二进制帧），之后零散的 print 改走 stderr
+    修改的是进程全局的 sys.stdout，只在进程入口 main() 中调用一次
+
+    Returns:
+        原 stdout 的二进制流，没有 stdout 时为 None
+    """
+    global protocol_stream
+    if protocol_stream is None and sys.stdout is not None and hasattr(sys.stdout, "buffer"):
+        sys.stdout.flush()
+        protocol_stream = sys.stdout.buffer
+        sys.stdout = sys.stderr
+    return protocol_stream
+
+class IpcWriter:
+    """
+    stdout 写线程：GUI 线程只把消息放入队列，父进程读取慢时不会阻塞界面
+    协议消息写到 reserve_stdout() 保留的流（未调用时为当前的 stdout），行模式下的日志文本写到 stderr
+    """
+    def __init__(self, framing="line", stream=None):
+        self.framing = framing
+        self.queue = queue.Queue()
+        if stream is None:
+            stream = protocol_stream or (sys.stdout.buffer if sys.stdout and hasattr(sys.stdout, "buffer") else None)
+        self.stream = stream
+        self.log_stream = sys.stderr.buffer if sys.stderr and hasattr(sys.stderr, "buffer") else None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def send(self, message):
+        self.queue.put((self.stream, json.dumps(message, ensure_ascii=False)))
+
+    def send_text(self, text):
+        """日志文本：行模式下原样写到 stderr，二进制分帧时包装为 log 事件"""
+        if self.framing == "length":
+            self.send({"type": "event", "event": "log", "data": text})
+        else:
+            self.queue.put((self.log_stream, text))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            stream, payload = item
+            if stream is None:
+                continue
+            data = payload.encode("utf-8")
+            try:
+                if stream is self.stream and self.framing == "length":
+                    stream.write(struct.pack(">I", len(data)) + data)
+                else:
+                    stream.write(data + b"\n")
+                stream.flush()
+            except (OSError, ValueError):
+                break
+
+    def close(self, timeout=1.0):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
 # ====================================================================
 # 锁定图标窗口
 # ====================================================================
@@ -153,13 +343,76 @@ class LockIconWidget(QWidget):
         if event.button() == Qt.MouseButton.LeftButton:
             self.toggled.emit(not self.is_locked)
 
+# ====================================================================
+# 休息图片渲染（在线程池中执行，只产出 QImage）
+# ====================================================================
+@lru_cache(maxsize=8)
+def build_edge_fade_mask(width, height, fade_width, fade_curve):
+    """
+    生成边缘渐隐的 alpha 蒙版：越靠近屏幕边缘越透明
+    只对一行、一列计算到边缘的距离曲线，再由 ImageChops.darker 取两者较小值得到整幅蒙版，
+    不做逐像素的 Python 循环；同一屏幕尺寸只计算一次
+    """
+    from PIL import Image, ImageChops
+    fade_px = max(1, int(min(width, height) * fade_width))
+    ramp = bytes(int(255 * pow(min(1.0, d / fade_px), fade_curve) + 0.5) for d in range(fade_px + 1))
+    row = bytes(ramp[min(x, width - 1 - x, fade_px)] for x in range(width))
+    column = bytes(ramp[min(y, height - 1 - y, fade_px)] for y in range(height))
+    horizontal = Image.frombytes("L", (width, 1), row).resize((width, height), Image.Resampling.NEAREST)
+    vertical = Image.frombytes("L", (1, height), column).resize((width, height), Image.Resampling.NEAREST)
+    return ImageChops.darker(horizontal, vertical)
+
+def render_rest_image(image_path, physical_width, physical_height, gamma, fade_width=0.0, fade_curve=1.0):
+    """读取、缩放裁剪、伽马校正并叠加边缘渐隐，返回物理像素尺寸的 QImage（线程安全，不涉及 QPixmap）"""
+    from PIL import Image, ImageChops
+    pil_image = Image.open(image_path).convert("RGBA")
+
+    # 计算保持比例缩放后的新尺寸 (使用整数物理尺寸)
+    img_ratio = pil_image.width / pil_image.height
+    screen_ratio = physical_width / physical_height
+    if img_ratio > screen_ratio:
+        new_height = physical_height
+        new_width = int(new_height * img_ratio)
+    else:
+        new_width = physical_width
+        new_height = int(new_width / img_ratio)
+
+    # PIL 高质量缩放，并直接裁剪到屏幕物理尺寸
+    resized_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    crop_x = (new_width - physical_width) // 2
+    crop_y = (new_height - physical_height) // 2
+    resized_image = resized_image.crop((crop_x, crop_y, crop_x + physical_width, crop_y + physical_height))
+
+    # PIL 伽马校正（RGBA 的 point 查找表按通道拼接，alpha 通道保持不变）
+    if gamma != 1.0:
+        gamma_lut = [int(pow(i / 255.0, gamma) * 255 + 0.5) for i in range(256)]
+        processed_image = resized_image.point(gamma_lut * 3 + list(range(256)))
+    else:
+        processed_image = resized_image
+
+    # 边缘渐隐：蒙版与原 alpha 相乘
+    if fade_width > 0:
+        mask = build_edge_fade_mask(physical_width, physical_height, fade_width, fade_curve)
+        processed_image.putalpha(ImageChops.multiply(processed_image.getchannel("A"), mask))
+
+    data = processed_image.tobytes("raw", "RGBA")
+    # copy() 让 QImage 持有自己的内存，脱离 data 的生命周期
+    return QImage(data, processed_image.width, processed_image.height, QImage.Format.Format_RGBA8888).copy()
+
 # ====================================================================
 # 休息图片窗口
 # ====================================================================
 class RestImageWidget(QWidget):
-    def __init__(self, config):
+    def __init__(self, config, manager, screen=None):
         super().__init__()
         self.config = config
+        # 渲染结果经由长期存在的 manager 回到 GUI 线程，本窗口可能在渲染期间随屏幕移除而被删除
+        self.manager = manager
+        self.target_screen = screen or QGuiApplication.primaryScreen()
+        # 渲染缓存：key 为 (图片路径, 文件修改时间, 物理尺寸, 设备像素比, gamma, 边缘渐隐宽度, 渐隐曲线)
+        self.cache_key = None
+        self.cached_pixmap = None
+        self.pending_key = None
         self.setup_ui()
         self.setup_animation()
 
@@ -167,6 +420,9 @@ class RestImageWidget(QWidget):
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint | Qt.WindowType.Tool | Qt.WindowType.WindowTransparentForInput)
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
         self.setWindowOpacity(0.0)
+        if self.target_screen is not None:
+            self.setScreen(self.target_screen)
+            self.setGeometry(self.target_screen.geometry())
 
     def setup_animation(self):
         self.animation = QPropertyAnimation(self, b"windowOpacity")
@@ -178,6 +434,8 @@ class RestImageWidget(QWidget):
 
     def fade_in(self):
         self.animation.setDirection(QPropertyAnimation.Direction.Forward)
+        if self.target_screen is not None:
+            self.setGeometry(self.target_screen.geometry())
         self.showFullScreen()
         self.animation.start()
 
@@ -189,59 +447,170 @@ class RestImageWidget(QWidget):
         if self.animation.direction() == QPropertyAnimation.Direction.Backward:
             self.hide()
 
+    def update_animation(self):
+        self.animation.setDuration(self.config["fade_duration"])
+        self.animation.setEndValue(self.config["rest_image_opacity"])
+        if self.isVisible() and self.animation.state() != QPropertyAnimation.State.Running:
+            self.setWindowOpacity(self.config["rest_image_opacity"])
+
+    def invalidate(self):
+        """图片相关配置变化：显示中则后台重建（期间继续画旧图），隐藏时直接释放缓存"""
+        if self.isVisible():
+            self.update()
+        else:
+            self.cache_key = None
+            self.cached_pixmap = None
+            self.pending_key = None
+
+    def hideEvent(self, event):
+        # 隐藏后释放缓存的全屏位图，下次休息前再预渲染
+        self.cache_key = None
+        self.cached_pixmap = None
+        self.pending_key = None
+        super().hideEvent(event)
+
+    def cache_key_for(self, width, height, pixel_ratio):
+        image_path = self.config["image_path"]
+        try:
+            mtime = os.path.getmtime(image_path)
+        except OSError:
+            mtime = None
+        physical_size = (int(width * pixel_ratio), int(height * pixel_ratio))
+        return (image_path, mtime, physical_size, pixel_ratio, self.config.get("rest_image_gamma", 1.0),
+                self.config.get("edge_fade_width", 0.0), self.config.get("edge_fade_curve", 1.0))
+
+    def current_cache_key(self):
+        return self.cache_key_for(self.width(), self.height(), self.devicePixelRatioF())
+
+    def prefetch(self):
+        """在休息开始前按目标屏幕尺寸预渲染图片，fade_in 时直接使用缓存"""
+        if not self.config["image_path"]:
+            return
+        screen = self.target_screen
+        if screen is None:
+            return
+        size = screen.geometry().size()
+        key = self.cache_key_for(size.width(), size.height(), screen.devicePixelRatio())
+        if key != self.cache_key:
+            self.request_render(key)
+
+    def request_render(self, key):
+        """key 变化时在线程池中重建缓存，同一 key 只提交一次"""
+        if key == self.pending_key:
+            return
+        self.pending_key = key
+        image_path, _, (physical_width, physical_height), _, gamma, fade_width, fade_curve = key
+        manager, overlay = self.manager, self
+
+        def job():
+            try:
+                q_image = render_rest_image(image_path, physical_width, physical_height, gamma, fade_width, fade_curve)
+            except Exception as e:
+                print(f"[EyeCareApp]: Error during PIL image processing: {e}", flush=True)
+                q_image = None
+            manager.imageRendered.emit(overlay, key, q_image)
+
+        QThreadPool.globalInstance().start(job)
+
+    def on_image_rendered(self, key, q_image):
+        if key != self.pending_key:
+            return  # 已过期的渲染结果
+        self.pending_key = None
+        self.cache_key = key
+        if q_image is None:
+            # 渲染失败也记录 key，避免每一帧重复提交
+            self.cached_pixmap = None
+            return
+        pixmap = QPixmap.fromImage(q_image)
+        pixmap.setDevicePixelRatio(key[3])
+        self.cached_pixmap = pixmap
+        self.update()
+
     def paintEvent(self, event):
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         if not self.config["image_path"]:
             painter.fillRect(self.rect(), QColor(30, 30, 30))
             return
-        try:
-            # 1. 获取真实的物理像素尺寸并立即转换为整数
-            pixel_ratio = self.devicePixelRatioF()
-            physical_width = int(self.width() * pixel_ratio)
-            physical_height = int(self.height() * pixel_ratio)
-
-            # 2. PIL 读取图像
-            pil_image = Image.open(self.config["image_path"]).convert("RGBA")
-            
-            # 3. 计算保持比例缩放后的新尺寸 (使用整数物理尺寸)
-            img_ratio = pil_image.width / pil_image.height
-            screen_ratio = physical_width / physical_height
-            if img_ratio > screen_ratio:
-                new_height = physical_height
-                new_width = int(new_height * img_ratio)
-            else:
-                new_width = physical_width
-                new_height = int(new_width / img_ratio)
-
-            # 4. PIL 高质量缩放
-            resized_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-            # 5. PIL 伽马校正
-            gamma = self.config.get("rest_image_gamma", 1.0)
-            if gamma != 1.0:
-                gamma_lut = [pow(i / 255.0, gamma) * 255 for i in range(256)]
-                r, g, b, a = resized_image.split()
-                r = r.point(gamma_lut); g = g.point(gamma_lut); b = b.point(gamma_lut)
-                processed_image = Image.merge('RGBA', (r, g, b, a))
+        key = self.current_cache_key()
+        if key == self.cache_key:
+            if self.cached_pixmap is not None:
+                painter.drawPixmap(0, 0, self.cached_pixmap)
             else:
-                processed_image = resized_image
+                painter.fillRect(self.rect(), QColor(30, 30, 30))
+            return
+        # 缓存未命中（预渲染尚未完成或配置刚变更）：先画旧图或纯色，不阻塞渐变动画，后台渲染完成后再重绘
+        if self.cached_pixmap is not None:
+            painter.drawPixmap(self.rect(), self.cached_pixmap)
+        else:
+            painter.fillRect(self.rect(), QColor(30, 30, 30))
+        if key[2][0] > 0 and key[2][1] > 0:
+            self.request_render(key)
 
-            # 6. 转换回 Qt 对象
-            data = processed_image.tobytes("raw", "RGBA")
-            q_image = QImage(data, processed_image.width, processed_image.height, QImage.Format.Format_RGBA8888)
-            final_pixmap = QPixmap.fromImage(q_image)
-            final_pixmap.setDevicePixelRatio(pixel_ratio)
+# ====================================================================
+# 多屏休息遮罩管理
+# ====================================================================
+class RestOverlayManager(QObject):
+    """每个屏幕一个 RestImageWidget，各自按该屏幕的物理分辨率渲染缓存，渲染任务在线程池中并行执行"""
+    # 渲染线程完成后通过信号回到 GUI 线程 (RestImageWidget, cache_key, QImage 或 None)
+    imageRendered = Signal(object, object, object)
+
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.overlays = {}
+        self.is_resting = False
+        self.imageRendered.connect(self.on_image_rendered)
+        app = QGuiApplication.instance()
+        for screen in app.screens():
+            self.add_screen(screen)
+        app.screenAdded.connect(self.add_screen)
+        app.screenRemoved.connect(self.remove_screen)
 
-            # 7. 最终绘制：只使用整数计算和 QRect
-            crop_x = (new_width - physical_width) // 2
-            crop_y = (new_height - physical_height) // 2
-            source_rect = QRect(crop_x, crop_y, physical_width, physical_height)
-            painter.drawPixmap(self.rect(), final_pixmap, source_rect)
+    def add_screen(self, screen):
+        if screen in self.overlays:
+            return
+        overlay = RestImageWidget(self.config, self, screen)
+        self.overlays[screen] = overlay
+        # 休息中接入的新屏幕直接淡入
+        if self.is_resting:
+            overlay.fade_in()
 
-        except Exception as e:
-            print(f"[EyeCareApp]: Error during PIL image processing: {e}", flush=True)
-            painter.fillRect(self.rect(), QColor(30, 30, 30))
+    def remove_screen(self, screen):
+        overlay = self.overlays.pop(screen, None)
+        if overlay is not None:
+            overlay.close()
+            overlay.deleteLater()
+
+    def on_image_rendered(self, overlay, key, q_image):
+        # 屏幕已移除的窗口可能已被删除，只按身份比较，不访问它
+        if any(current is overlay for current in self.overlays.values()):
+            overlay.on_image_rendered(key, q_image)
+
+    def prefetch(self):
+        for overlay in self.overlays.values():
+            overlay.prefetch()
+
+    def invalidate(self):
+        for overlay in self.overlays.values():
+            overlay.invalidate()
+
+    def update_animation(self):
+        for overlay in self.overlays.values():
+            overlay.update_animation()
+
+    def fade_in(self):
+        self.is_resting = True
+        for overlay in self.overlays.values():
+            overlay.fade_in()
+
+    def fade_out(self):
+        self.is_resting = False
+        for overlay in self.overlays.values():
+            overlay.fade_out()
+
+    def close(self):
+        for overlay in self.overlays.values():
+            overlay.close()
 
 # ====================================================================
 # 主计时器窗口
@@ -253,20 +622,25 @@ class EyeCareTimerWidget(QWidget):
         if config:
             self.config.update(config)
         self.base_config = self.config.copy()
+        self.ipc_writer = IpcWriter(self.config["ipc_framing"])
+        self.state_subscribed = False
+        self.last_state_key = None
         self.scale_factor = 1.0
         self.is_locked = False
-        self.is_paused = False
         self.state = "work"
         self.work_seconds = self.config["work_minutes"] * 60
         self.rest_seconds = self.config["rest_minutes"] * 60
-        self.time_left = self.work_seconds
-        self.rest_widget = RestImageWidget(self.config)
+        self.countdown = PhaseCountdown()
+        self.countdown.start(self.work_seconds)
+        self.rest_overlay = RestOverlayManager(self.config)
         self.lock_widget = LockIconWidget()
         self.setup_ui()
+        self.setup_menu()
         self.apply_theme(self.config["theme"])
         self.setup_timer()
         self.create_tray_icon()
         self.setup_ipc_listener()
+        self.setup_config_watcher()
         self.old_pos = None
         self.lock_widget.toggled.connect(self.toggle_lock)
 
@@ -283,15 +657,93 @@ class EyeCareTimerWidget(QWidget):
         self.update_label()
 
     def setup_timer(self):
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_timer)
-        self.timer.start(1000)
+        # 状态切换：单次定时器，直接定在截止时间上
+        self.transition_timer = QTimer(self)
+        self.transition_timer.setSingleShot(True)
+        self.transition_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.transition_timer.timeout.connect(self.on_transition_timeout)
+        # 预渲染休息图片：工作结束前 rest_prefetch_seconds 秒触发一次
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.timeout.connect(self.rest_overlay.prefetch)
+        # 标签刷新：仅在窗口可见时按整秒边界刷新，隐藏时完全不唤醒
+        self.label_timer = QTimer(self)
+        self.label_timer.setSingleShot(True)
+        self.label_timer.timeout.connect(self.on_label_tick)
+        self.schedule_timers()
+
+    @property
+    def is_paused(self):
+        return self.countdown.is_paused
+
+    @property
+    def time_left(self):
+        return self.countdown.remaining()
+
+    def start_countdown(self, seconds):
+        self.countdown.start(seconds)
+        self.schedule_timers()
+        self.update_label()
+        self.notify_state()
+
+    def pause_timer(self):
+        if self.is_paused: return
+        self.log_message("Timer paused.")
+        self.countdown.pause()
+        self.schedule_timers()
+        self.update_label()
+        self.notify_state()
+
+    def resume_timer(self):
+        if not self.is_paused: return
+        self.log_message("Timer resumed.")
+        self.countdown.resume()
+        self.schedule_timers()
+        self.update_label()
+        self.notify_state()
+
+    def schedule_timers(self):
+        """根据截止时间重新安排所有单次定时器"""
+        self.transition_timer.stop()
+        self.prefetch_timer.stop()
+        self.schedule_label_tick()
+        if self.is_paused:
+            return
+        remaining = self.countdown.remaining()
+        # 单次休眠设上限，系统休眠唤醒后最迟在上限内重新对时
+        self.transition_timer.start(int(min(remaining, self.config["max_timer_sleep"]) * 1000))
+        if self.state == "work":
+            prefetch_in = remaining - self.config["rest_prefetch_seconds"]
+            if prefetch_in <= 0:
+                self.rest_overlay.prefetch()
+            else:
+                self.prefetch_timer.start(int(prefetch_in * 1000))
+
+    def schedule_label_tick(self):
+        self.label_timer.stop()
+        if not self.isVisible() or self.is_paused:
+            return
+        # 定到下一个整秒边界，显示的秒数不会漂移
+        fraction = self.countdown.remaining() % 1.0
+        self.label_timer.start(int(fraction * 1000) + 1 if fraction > 0 else 1000)
+
+    def on_label_tick(self):
+        self.update_label()
+        self.schedule_label_tick()
+
+    def on_transition_timeout(self):
+        if self.countdown.remaining() > 0:
+            # 定时器提前或因休眠上限醒来，按截止时间重新安排
+            self.schedule_timers()
+            return
+        if self.state == "work": self.start_rest()
+        else: self.start_work()
 
     def setup_ipc_listener(self):
         if sys.stdin and hasattr(sys.stdin, 'fileno'):
             try:
                 sys.stdin.fileno()
-                self.listener = CommandListenerThread(self)
+                self.listener = CommandListenerThread(self, self.config["ipc_framing"])
                 self.listener.commandReceived.connect(self.handle_command)
                 self.listener.start()
             except io.UnsupportedOperation:
@@ -299,6 +751,32 @@ class EyeCareTimerWidget(QWidget):
         else:
             self.log_message("IPC listener disabled: No stdin detected.")
 
+    def setup_config_watcher(self):
+        self.config_watcher = None
+        if not self.config["config_path"]:
+            return
+        self.config_watcher = QFileSystemWatcher([self.config["config_path"]], self)
+        self.config_watcher.fileChanged.connect(self.on_config_file_changed)
+        # 编辑器保存时常常连续触发多次，合并为一次重载
+        self.config_reload_timer = QTimer(self)
+        self.config_reload_timer.setSingleShot(True)
+        self.config_reload_timer.setInterval(200)
+        self.config_reload_timer.timeout.connect(self.load_config_file)
+
+    def on_config_file_changed(self, path):
+        # 以“写临时文件再替换”方式保存时，监听会丢失，需要重新加入
+        if path not in self.config_watcher.files() and os.path.exists(path):
+            self.config_watcher.addPath(path)
+        self.config_reload_timer.start()
+
+    def load_config_file(self):
+        try:
+            with open(self.config["config_path"], encoding="utf-8") as fd:
+                new_config = json.load(fd)
+            self.reload_config(new_config)
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            self.log_message(f"Error reloading config file: {e}")
+
     def wheelEvent(self, event):
         if self.is_locked: return
         delta = event.angleDelta().y()
@@ -330,7 +808,7 @@ class EyeCareTimerWidget(QWidget):
     def contextMenuEvent(self, event):
         if self.is_locked: return
         self.lock_widget.raise_()
-        self.create_menu().exec(event.globalPos())
+        self.menu.exec(event.globalPos())
         
 
     def mousePressEvent(self, event):
@@ -352,75 +830,211 @@ class EyeCareTimerWidget(QWidget):
         self.lock_widget.show()
         self.lock_widget.raise_()
         super().showEvent(event)
+        self.update_label()
+        self.schedule_label_tick()
 
     def hideEvent(self, event):
         self.lock_widget.hide()
+        self.label_timer.stop()
         super().hideEvent(event)
 
     def log_message(self, message):
         output = f"[EyeCareApp]: {message}"
-        print(output, flush=True)
-
-    def update_timer(self):
-        if self.is_paused: return
-        self.time_left -= 1
-        if self.time_left < 0:
-            if self.state == "work": self.start_rest()
-            else: self.start_work()
-        self.update_label()
+        self.ipc_writer.send_text(output)
 
     def start_work(self):
         self.log_message("State changed to: Work")
         self.state = "work"
-        self.time_left = self.base_config["work_minutes"] * 60
-        self.rest_widget.fade_out()
-        self.update_label()
+        self.start_countdown(self.base_config["work_minutes"] * 60)
+        self.rest_overlay.fade_out()
 
     def start_rest(self):
         self.log_message("State changed to: Rest")
         self.state = "rest"
-        self.time_left = self.base_config["rest_minutes"] * 60
-        self.rest_widget.fade_in()
-        self.update_label()
+        self.start_countdown(self.base_config["rest_minutes"] * 60)
+        self.rest_overlay.fade_in()
         self.raise_()
         self.lock_widget.raise_()
     def extend_work_time(self):
         self.log_message("Work time extended by 5 minutes.")
+        remaining = self.time_left if self.state == "work" else 0
         if self.state == "rest":
             self.state = "work"
-            self.rest_widget.fade_out()
-        self.time_left = (self.time_left if self.state == 'work' else 0) + 5 * 60
-        self.update_label()
+            self.rest_overlay.fade_out()
+        self.start_countdown(remaining + 5 * 60)
 
     def reset_timer(self):
         self.log_message("Timer reset.")
-        if self.state == "work": self.time_left = self.base_config["work_minutes"] * 60
-        else: self.time_left = self.base_config["rest_minutes"] * 60
-        self.update_label()
+        if self.state == "work": self.start_countdown(self.base_config["work_minutes"] * 60)
+        else: self.start_countdown(self.base_config["rest_minutes"] * 60)
 
     def set_time(self, seconds):
         if isinstance(seconds, int) and seconds >= 0:
             self.log_message(f"Time set externally to {seconds} seconds.")
-            self.time_left = seconds
-            self.update_label()
+            self.start_countdown(seconds)
 
     def handle_command(self, command_str):
         self.log_message(f"Received IPC command: {command_str}")
         try:
             cmd_data = json.loads(command_str)
-            command = cmd_data.get("command")
-            value = cmd_data.get("value")
-            if command == "set_theme" and value in THEMES: self.set_theme(value)
-            elif command == "set_font" and value in AVAILABLE_FONTS: self.set_font(value)
-            elif command == "set_time" and isinstance(value, int): self.set_time(value)
-        except Exception as e:
+        except ValueError as e:
             self.log_message(f"Error processing IPC command: {e}")
+            self.ipc_writer.send({"id": None, "type": "error", "error": {"code": "parse_error", "message": str(e)}})
+            return
+        if not isinstance(cmd_data, dict):
+            self.ipc_writer.send({"id": None, "type": "error", "error": {"code": "invalid_request", "message": "request must be an object"}})
+            return
+        if "method" not in cmd_data:
+            self.handle_legacy_command(cmd_data)
+            return
+        request_id = cmd_data.get("id")
+        handler = self.ipc_methods().get(cmd_data["method"])
+        if handler is None:
+            self.ipc_writer.send({"id": request_id, "type": "error", "error": {"code": "unknown_method", "message": f"unknown method: {cmd_data['method']}"}})
+            return
+        params = cmd_data.get("params")
+        if params is None:
+            params = {}
+        if not isinstance(params, dict):
+            self.ipc_writer.send({"id": request_id, "type": "error", "error": {"code": "invalid_params", "message": "params must be an object"}})
+            return
+        try:
+            result = handler(params)
+        except (ValueError, TypeError, KeyError) as e:
+            self.log_message(f"Error processing IPC command: {e}")
+            self.ipc_writer.send({"id": request_id, "type": "error", "error": {"code": "invalid_params", "message": str(e)}})
+            return
+        except Exception as e:
+            # 其余异常也必须回复，否则父进程会一直等待这个 id 的结果
+            self.log_message(f"Error processing IPC command: {e!r}")
+            self.ipc_writer.send({"id": request_id, "type": "error", "error": {"code": "internal_error", "message": repr(e)}})
+            return
+        self.ipc_writer.send({"id": request_id, "type": "result", "result": result})
+
+    def handle_legacy_command(self, cmd_data):
+        command = cmd_data.get("command")
+        value = cmd_data.get("value")
+        if command == "set_theme" and value in THEMES: self.set_theme(value)
+        elif command == "set_font" and value in AVAILABLE_FONTS: self.set_font(value)
+        elif command == "set_time" and isinstance(value, int): self.set_time(value)
+
+    def ipc_methods(self):
+        return {
+            "get_state": lambda params: self.state_snapshot(),
+            "set_config": self.ipc_reload_config,
+            "reload_config": self.ipc_reload_config,
+            "pause": lambda params: (self.pause_timer(), self.state_snapshot())[1],
+            "resume": lambda params: (self.resume_timer(), self.state_snapshot())[1],
+            "subscribe_state": self.ipc_subscribe_state,
+        }
+
+    def ipc_reload_config(self, params):
+        changed = self.reload_config(params)
+        return {"changed": changed, "state": self.state_snapshot()}
+
+    def ipc_subscribe_state(self, params):
+        self.state_subscribed = bool(params.get("enabled", True))
+        self.last_state_key = self.state_key()
+        return self.state_snapshot()
+
+    def state_key(self):
+        """事件推送只比较这些字段，time_left 每秒变化但不算状态变化"""
+        return (self.state, self.is_paused, self.is_locked, self.config["theme"], self.config["font_family"],
+                self.base_config["work_minutes"], self.base_config["rest_minutes"], self.countdown.deadline)
+
+    def state_snapshot(self):
+        return {
+            "state": self.state,
+            "paused": self.is_paused,
+            "locked": self.is_locked,
+            "time_left": math.ceil(self.time_left),
+            "theme": self.config["theme"],
+            "font_family": self.config["font_family"],
+            "work_minutes": self.base_config["work_minutes"],
+            "rest_minutes": self.base_config["rest_minutes"],
+        }
+
+    def notify_state(self):
+        if not self.state_subscribed:
+            return
+        key = self.state_key()
+        if key == self.last_state_key:
+            return
+        self.last_state_key = key
+        self.ipc_writer.send({"type": "event", "event": "state", "data": self.state_snapshot()})
+
+    def reload_config(self, new_config):
+        """对比新旧配置，只重做受影响的部分；图片相关配置未变化时不会重新处理图片"""
+        unknown = set(new_config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise KeyError(f"unsupported config key: {', '.join(sorted(unknown))}")
+        # 修改配置之前先按 DEFAULT_CONFIG 检查每一项的类型，错误的值不会写入
+        for key, value in new_config.items():
+            default = DEFAULT_CONFIG[key]
+            if default is None:
+                valid = value is None or isinstance(value, str)
+            elif isinstance(default, (int, float)):
+                valid = isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+            else:
+                valid = isinstance(value, type(default))
+            if not valid:
+                raise ValueError(f"invalid {key}: {value!r}")
+        if "theme" in new_config and new_config["theme"] not in THEMES:
+            raise ValueError(f"unknown theme: {new_config['theme']}")
+        if new_config.get("font_family") is not None and new_config["font_family"] not in AVAILABLE_FONTS:
+            raise ValueError(f"unknown font: {new_config['font_family']}")
+        for key in ("work_minutes", "rest_minutes"):
+            if key in new_config and new_config[key] <= 0:
+                raise ValueError(f"invalid {key}: {new_config[key]}")
+        changed = {key: value for key, value in new_config.items() if self.config.get(key) != value}
+        for key in STARTUP_ONLY_CONFIG_KEYS:
+            if changed.pop(key, None) is not None:
+                self.log_message(f"Config key '{key}' only takes effect after restart.")
+        if not changed:
+            return []
+        old_config = {key: self.config[key] for key in changed}
+        old_base_config = {key: self.base_config.get(key) for key in changed}
+        self.config.update(changed)
+        self.base_config.update(changed)
+        try:
+            self.apply_config_changes(changed, old_config)
+        except Exception:
+            # 应用失败时恢复旧值，之后的计时和界面刷新不受影响
+            self.config.update(old_config)
+            self.base_config.update(old_base_config)
+            self.apply_config_changes(changed, changed)
+            raise
+        self.log_message(f"Config reloaded: {', '.join(sorted(changed))}")
+        self.notify_state()
+        return sorted(changed)
+
+    def apply_config_changes(self, changed, old_config):
+        """按变化的配置项重做受影响的部分，old_config 为变化前的值"""
+        if "theme" in changed:
+            self.apply_theme(self.config["theme"])
+        elif "font_family" in changed:
+            self.apply_font()
+            self.refresh_menu()
+        if any(key in changed for key in GEOMETRY_CONFIG_KEYS):
+            self.apply_scale()
+        if any(key in changed for key in IMAGE_CONFIG_KEYS):
+            self.rest_overlay.invalidate()
+        if any(key in changed for key in ANIMATION_CONFIG_KEYS):
+            self.rest_overlay.update_animation()
+        phase_key = "work_minutes" if self.state == "work" else "rest_minutes"
+        if phase_key in changed:
+            # 当前阶段时长变化：按差值平移截止时间
+            delta = (self.config[phase_key] - old_config[phase_key]) * 60
+            self.start_countdown(max(0, self.time_left + delta))
+        elif any(key in changed for key in SCHEDULE_CONFIG_KEYS + IMAGE_CONFIG_KEYS):
+            # 重新安排预渲染，图片变化且已在预渲染窗口内时立即重建
+            self.schedule_timers()
 
     def apply_scale(self):
         new_width = self.base_config["window_width"] * self.scale_factor
         new_height = self.base_config["window_height"] * self.scale_factor
         self.resize(int(new_width), int(new_height))
-        self.apply_theme(self.config["theme"])
+        self.apply_font()
 
     def set_theme(self, name):
         if name in THEMES:
@@ -428,6 +1042,7 @@ class EyeCareTimerWidget(QWidget):
             self.config["theme"] = name
             self.config["font_family"] = None
             self.apply_theme(name)
+            self.notify_state()
         else:
             self.log_message(f"Error: Theme '{name}' not found.")
 
@@ -435,58 +1050,88 @@ class EyeCareTimerWidget(QWidget):
         if font_name in AVAILABLE_FONTS:
             self.log_message(f"Setting font to: {font_name}")
             self.config["font_family"] = font_name
-            self.apply_theme(self.config["theme"])
+            self.apply_font()
+            self.refresh_menu()
+            self.notify_state()
 
     def apply_theme(self, name):
         theme = THEMES[name]
-        self.config.update(theme)
-        font_family = self.config["font_family"] or theme["font_family"]
-        base_font_size = 14
-        new_font_size = int(base_font_size * self.scale_factor)
-        font_style = theme.get("text_style", "font-weight: normal;")
-        self.time_label.setStyleSheet(f"color: {theme['text'].name()}; font-size: {new_font_size}px; {font_style} font-family: '{font_family}';")
+        # 主题自带字体只作为默认值，不覆盖用户选择的 font_family
+        self.config.update({key: value for key, value in theme.items() if key != "font_family"})
+        self.time_label.setPalette(theme_palette(name))
+        self.apply_font()
         self.lock_widget.set_theme(theme)
+        self.refresh_menu()
         self.update()
 
+    def apply_font(self):
+        theme = THEMES[self.config["theme"]]
+        font_family = self.config["font_family"] or theme["font_family"]
+        bold = "bold" in theme.get("text_style", "font-weight: normal;")
+        self.time_label.setFont(scaled_font(font_family, int(BASE_FONT_SIZE * self.scale_factor), bold))
+
     def update_label(self):
-        mins, secs = divmod(self.time_left, 60)
+        mins, secs = divmod(math.ceil(self.time_left), 60)
         time_str = f"{int(mins):02d}:{int(secs):02d}"
         prefix = "Paused" if self.is_paused else ("Work" if self.state == "work" else "Rest")
         self.time_label.setText(f"{prefix}: {time_str}")
 
-    def create_menu(self):
-        menu = QMenu(self)
-        theme = THEMES[self.config.get("theme", "Dark")]
-        qss = f"""            QMenu {{                 background-color: {theme['menu_background'].name()};                 color: {theme['menu_text'].name()};                 border: 1px solid {theme['menu_border'].name()};                 border-radius: 5px; padding: 5px;             }}            QMenu::item {{ padding: 8px 25px 8px 20px; border-radius: 4px; }}            QMenu::item:selected {{ background-color: {theme['menu_selected_background'].name()}; }}            QMenu::item:disabled {{ color: {theme['menu_disabled_text'].name()}; }}            QMenu::separator {{ height: 1px; background-color: {theme['menu_separator'].name()}; margin: 5px 0px; }}        """
-        menu.setStyleSheet(qss)
+    def setup_menu(self):
+        """右键菜单与托盘菜单共用一个 QMenu，只构建一次，之后只更新勾选状态和锁定文字"""
+        self.menu = QMenu(self)
+        self.menu_theme = None
         extend_action = QAction("延长5分钟工作", self, triggered=self.extend_work_time)
         actions = [extend_action, QAction("立即休息", self, triggered=self.start_rest), QAction("立即工作", self, triggered=self.start_work), QAction("重置计时", self, triggered=self.reset_timer)]
-        menu.addActions(actions)
-        menu.addSeparator()
-        theme_menu = menu.addMenu("主题")
+        self.menu.addActions(actions)
+        self.menu.addSeparator()
+        theme_menu = self.menu.addMenu("主题")
+        self.theme_group = QActionGroup(self)
+        self.theme_actions = {}
         for theme_name in THEMES:
             action = QAction(theme_name, self, checkable=True)
-            action.setChecked(theme_name == self.config["theme"])
             action.triggered.connect(lambda checked=False, name=theme_name: self.set_theme(name))
+            self.theme_group.addAction(action)
             theme_menu.addAction(action)
+            self.theme_actions[theme_name] = action
 
-        font_menu = menu.addMenu("字体")
-        current_font = self.config["font_family"] or theme["font_family"]
+        font_menu = self.menu.addMenu("字体")
+        self.font_group = QActionGroup(self)
+        self.font_actions = {}
         for font_name in AVAILABLE_FONTS:
             action = QAction(font_name, self, checkable=True)
-            action.setChecked(font_name == current_font)
             action.triggered.connect(lambda checked=False, name=font_name: self.set_font(name))
+            self.font_group.addAction(action)
             font_menu.addAction(action)
-        menu.addSeparator()
-        menu.addAction(QAction("解锁" if self.is_locked else "锁定", self, triggered=lambda: self.toggle_lock(not self.is_locked)))
-        menu.addSeparator()
-        menu.addAction(QAction("退出", self, triggered=self.close_app))
-        return menu
+            self.font_actions[font_name] = action
+        self.menu.addSeparator()
+        self.lock_action = QAction("锁定", self, triggered=lambda: self.toggle_lock(not self.is_locked))
+        self.menu.addAction(self.lock_action)
+        self.menu.addSeparator()
+        self.menu.addAction(QAction("退出", self, triggered=self.close_app))
+
+    def refresh_menu(self):
+        """同步菜单的勾选状态；样式表只在主题变化时重新设置"""
+        theme_name = self.config.get("theme", "Dark")
+        theme = THEMES[theme_name]
+        if theme_name != self.menu_theme:
+            self.menu_theme = theme_name
+            qss = f"""            QMenu {{                 background-color: {theme['menu_background'].name()};                 color: {theme['menu_text'].name()};                 border: 1px solid {theme['menu_border'].name()};                 border-radius: 5px; padding: 5px;             }}            QMenu::item {{ padding: 8px 25px 8px 20px; border-radius: 4px; }}            QMenu::item:selected {{ background-color: {theme['menu_selected_background'].name()}; }}            QMenu::item:disabled {{ color: {theme['menu_disabled_text'].name()}; }}            QMenu::separator {{ height: 1px; background-color: {theme['menu_separator'].name()}; margin: 5px 0px; }}        """
+            self.menu.setStyleSheet(qss)
+        self.theme_actions[theme_name].setChecked(True)
+        current_font = self.config["font_family"] or theme["font_family"]
+        if current_font in self.font_actions:
+            self.font_actions[current_font].setChecked(True)
+        else:
+            checked = self.font_group.checkedAction()
+            if checked: checked.setChecked(False)
+        self.lock_action.setText("解锁" if self.is_locked else "锁定")
 
     def toggle_lock(self, is_locked):
         self.is_locked = is_locked
         self.lock_widget.set_locked_state(is_locked)
+        self.lock_action.setText("解锁" if is_locked else "锁定")
         self.log_message(f"Window {'locked' if is_locked else 'unlocked'}.")
+        self.notify_state()
         if self.is_locked:
             self.setWindowFlags(self.base_flags | Qt.WindowType.WindowTransparentForInput)
         else:
@@ -498,32 +1143,72 @@ class EyeCareTimerWidget(QWidget):
         self.tray_icon = QSystemTrayIcon(self)
         icon = self.style().standardIcon(QStyle.StandardPixmap.SP_DesktopIcon)
         self.tray_icon.setIcon(icon)
-        self.tray_icon.setContextMenu(self.create_menu())
+        self.tray_icon.setContextMenu(self.menu)
         self.tray_icon.show()
         self.tray_icon.setToolTip("护眼助手")
-        self.tray_icon.contextMenu().aboutToShow.connect(lambda: self.tray_icon.setContextMenu(self.create_menu()))
 
     def close_app(self):
         self.log_message("Application closing.")
         if hasattr(self, 'listener') and self.listener.isRunning():
             self.listener.quit()
-        self.rest_widget.close()
+        self.ipc_writer.close()
+        self.rest_overlay.close()
         self.lock_widget.close()
         self.close()
         QApplication.instance().quit()
 
+# ====================================================================
+# 启动耗时分析（--startup-profile）
+# ====================================================================
+class StartupProfiler(QObject):
+    """记录导入、QApplication、窗口构建到首帧绘制的各阶段耗时，首帧绘制后输出到 stderr"""
+    def __init__(self):
+        super().__init__()
+        self.marks = [("import stdlib", STARTUP_T_STDLIB), ("import PySide6", STARTUP_T_QT)]
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def watch_first_paint(self, widget):
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.Paint:
+            watched.removeEventFilter(self)
+            # 等本次绘制完成后再记录首帧
+            QTimer.singleShot(0, self.on_first_paint)
+        return False
+
+    def on_first_paint(self):
+        self.mark("first paint")
+        self.report()
+
+    def report(self):
+        previous = STARTUP_T0
+        lines = ["[StartupProfile]: stage                  delta(ms)  total(ms)"]
+        for name, stamp in self.marks:
+            lines.append(f"[StartupProfile]: {name:<22} {(stamp - previous) * 1000:9.1f}  {(stamp - STARTUP_T0) * 1000:9.1f}")
+            previous = stamp
+        lines.append(f"[StartupProfile]: PIL loaded: {'PIL.Image' in sys.modules}")
+        print("\n".join(lines), file=sys.stderr, flush=True)
+
 # ====================================================================
 # 主程序入口
 # ====================================================================
-def run_app(config=None):
+def run_app(config=None, profiler=None):
     if QApplication.instance() is None:
         app = QApplication(sys.argv)
         QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
         QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
     else:
         app = QApplication.instance()
+    if profiler:
+        profiler.mark("QApplication")
 
     main_widget = EyeCareTimerWidget(config)
+    if profiler:
+        profiler.mark("widget construct")
+        profiler.watch_first_paint(main_widget)
     main_widget.show()
     
     # 仅当作为主脚本运行时，才执行app.exec()
@@ -531,11 +1216,26 @@ def run_app(config=None):
         sys.exit(app.exec())
     return main_widget
 
+def main(argv=None):
+    """作为受管子进程启动的入口：--config 指定 JSON 配置文件（同时开启热重载），--startup-profile 输出启动耗时"""
+    parser = argparse.ArgumentParser(description="护眼助手")
+    parser.add_argument("--config", help="JSON 配置文件路径")
+    parser.add_argument("--startup-profile", action="store_true", help="输出导入、构建与首帧绘制耗时")
+    args, _ = parser.parse_known_args(argv)
+    if args.config:
+        with open(args.config, encoding="utf-8") as fd:
+            config = json.load(fd)
+        config["config_path"] = args.config
+    else:
+        config = {
+            "work_minutes": 0.2,
+            "rest_minutes": 0.2,
+            "window_width": 140,
+            "image_path": r"D:\documentation\图片\pixiv\58145566_p0.png"
+        }
+    profiler = StartupProfiler() if args.startup_profile else None
+    reserve_stdout()
+    return run_app(config, profiler)
+
 if __name__ == "__main__":
-    custom_config = {
-        "work_minutes": 0.2,
-        "rest_minutes": 0.2,
-        "window_width": 140,
-        "image_path": r"D:\documentation\图片\pixiv\58145566_p0.png"
-    }
-    run_app(custom_config)
\ No newline at end of file
+    main()
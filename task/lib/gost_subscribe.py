@@ -1,31 +1,294 @@
 """负责从web更新加密的订阅信息，写入到data/下"""
 import base64
+import codecs
 import gzip
+import hashlib
+import locale
 import os
-from threading import Event, Thread
+from threading import Event, Thread, local
 from cryptography.fernet import Fernet
 import time
 import requests
 import subprocess
-from subprocess import Popen,CREATE_NO_WINDOW
+from subprocess import Popen
 import asyncio
 import json
+from concurrent.futures import ThreadPoolExecutor
+from .proc_utils import terminate_all
+
+# 订阅地址列表，可由 data/endpoints.json 或构造参数 endpoints 覆盖
+# name: 名称（gost 的配置变化会触发 gost 重启） url: 地址 path: 解密后写入的文件 encoding: 写文件的编码
+# timeout: 单次请求超时（秒） retries: 失败后的重试次数 backoff: 第一次重试前的等待（秒），之后每次翻倍
+DEFAULT_ENDPOINTS = [
+    {"name":"clash","url":"https://webcfg.cfg.novalplay.com","path":r"data\flying.yaml","encoding":"utf-8"},
+    {"name":"gost","url":"https://cmdline.cfg.novalplay.com","path":r"data\gost_info","encoding":None},
+]
+ENDPOINT_DEFAULTS = {"timeout":10,"retries":2,"backoff":1.0}
+ENDPOINT_REQUIRED = ("name","url","path")
+DEFAULT_GOST_INFO = "data/gost_info"  # 订阅列表中没有 gost 时读取的隧道配置
+CREATE_NO_WINDOW = getattr(subprocess,"CREATE_NO_WINDOW",0)  # 仅 Windows 有此标志
+
+class SubscriptionCipher(object):
+    """
+    订阅内容的加解密（服务器格式：base64(Fernet 令牌)）
+    Fernet 实例只创建一次并复用；bytes 进 bytes 出，不经过 str
+    """
+    def __init__(self,key:bytes) -> None:
+        self.fernet = Fernet(key)
+
+    def encrypt_bytes(self,data:bytes) -> bytes:
+        return base64.b64encode(self.fernet.encrypt(data))
+
+    def decrypt_bytes(self,data:bytes) -> bytes:
+        """
+        解密 base64(Fernet 令牌)
+        不是流式解密：Fernet 只接受完整的令牌，HMAC 校验和解密过程中会复制整个令牌和明文，
+        峰值内存约为正文的数倍（20MB 正文约 +150MB），订阅内容通常远小于此
+
+        Args:
+            data (bytes): 服务器返回的原始内容
+            
+        Returns:
+            bytes: 明文
+        """
+        return self.fernet.decrypt(base64.b64decode(data))
+
+class AtomicConfigFile(object):
+    """
+    配置文件的原子写入
+    新内容先写入同目录的临时文件并 fsync，再用 os.replace 替换，任何时刻读到的都是完整的旧文件或新文件；
+    内容摘要与现有文件相同时不写入（不改变修改时间，不会触发 clash 等文件监视的重新加载）
+    替换前把现有内容保存为 .bak（最后一个正常的版本），rollback() 可以恢复
+    """
+    def __init__(self,path:str) -> None:
+        self.path = path
+        self.backup_path = path + ".bak"
+
+    @staticmethod
+    def read_digest(path:str) -> str|None:
+        try:
+            with open(path,"rb") as fd:
+                return hashlib.sha256(fd.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def replace(path:str,data:bytes) -> None:
+        """写临时文件 -> fsync -> os.replace -> fsync 目录；替换前失败时删除临时文件"""
+        temp_path = path + ".tmp"
+        try:
+            with open(temp_path,"wb") as fd:
+                fd.write(data)
+                fd.flush()
+                os.fsync(fd.fileno())
+            os.replace(temp_path,path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        if os.name != "nt":  # Windows 不能对目录 fsync
+            dir_fd = os.open(os.path.dirname(os.path.abspath(path)),os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def write(self,data:bytes) -> bool:
+        """
+        写入新内容
+
+        Returns:
+            bool: 内容有变化并已写入返回 True，内容相同跳过返回 False
+        """
+        if self.read_digest(self.path) == hashlib.sha256(data).hexdigest():
+            return False
+        if os.path.exists(self.path):
+            with open(self.path,"rb") as fd:
+                self.replace(self.backup_path,fd.read())
+        self.replace(self.path,data)
+        return True
+
+    def rollback(self) -> bool:
+        """用 .bak 恢复上一个版本，没有备份时返回 False"""
+        if not os.path.exists(self.backup_path):
+            return False
+        with open(self.backup_path,"rb") as fd:
+            self.replace(self.path,fd.read())
+        return True
+
+class GostReconciler(object):
+    """
+    按监听地址管理 gost 隧道进程
+    gost_info 的每一行是一条隧道，以 -L 监听地址为键；配置变化时与正在运行的隧道比较，
+    只停止、启动或替换发生变化的隧道，命令行没变的隧道继续运行（PID 不变）
+    已经退出的隧道在下一次 reconcile 时重新启动；启动失败的隧道记入 failed，不影响其他隧道，下一次 reconcile 时再试
+    """
+    def __init__(self,spawn = None,stop_timeout:float = 3) -> None:
+        """
+        Args:
+            spawn: spawn(args:list[str]) -> Popen，默认以无窗口方式启动
+            stop_timeout (float): 停止隧道时等待退出的时限，超时后强制结束
+        """
+        self.spawn = spawn or (lambda args: Popen(args=args,creationflags=CREATE_NO_WINDOW))
+        self.stop_timeout = stop_timeout
+        self.running:dict[str,tuple[tuple[str,...],Popen]] = {}  # 监听地址 -> (参数, 进程)
+        self.errors:dict[str,str] = {}  # 最近一次 reconcile 中启动失败的监听地址 -> 错误
+
+    @staticmethod
+    def parse(lines) -> dict[str,tuple[str,...]]:
+        """
+        把 gost_info 的内容解析为 {监听地址: 参数}
+        空行和 # 开头的行被忽略；没有 -L 的行以整行作为键
+        """
+        specs = {}
+        for line in lines:
+            args = tuple(line.split())
+            if not args or args[0].startswith("#"):
+                continue
+            listens = [args[i + 1] for i,arg in enumerate(args[:-1]) if arg == "-L"]
+            listens += [arg[3:] for arg in args if arg.startswith("-L=")]
+            specs[",".join(listens) if listens else " ".join(args)] = args
+        return specs
+
+    def reconcile(self,specs:dict[str,tuple[str,...]]) -> dict[str,list[str]]:
+        """
+        使正在运行的隧道与 specs 一致
+
+        Returns:
+            dict[str,list[str]]: started/replaced/stopped/unchanged/failed 对应的监听地址，失败原因见 errors
+        """
+        result = {"started":[],"replaced":[],"stopped":[],"unchanged":[],"failed":[]}
+        self.errors = {}
+        outdated = []
+        for key,(args,process) in self.running.items():
+            if specs.get(key) == args and process.poll() is None:
+                result["unchanged"].append(key)
+            else:
+                outdated.append(key)
+        # 先并行停止需要替换或删除的隧道，释放端口后再启动新的
+        terminate_all([self.running[key][1] for key in outdated],self.stop_timeout)
+        for key in outdated:
+            del self.running[key]
+            if key not in specs:
+                result["stopped"].append(key)
+        for key,args in specs.items():
+            if key in self.running:
+                continue
+            try:
+                self.running[key] = (args,self.spawn(list(args)))
+            except (OSError,ValueError) as e:
+                # 找不到程序、参数非法等：只影响这一条隧道
+                result["failed"].append(key)
+                self.errors[key] = repr(e)
+                continue
+            result["replaced" if key in outdated else "started"].append(key)
+        return result
+
+    def stop_all(self) -> dict:
+        result = terminate_all([process for args,process in self.running.values()],self.stop_timeout)
+        self.running.clear()
+        return result
+
+
+class SubscriptionFetcher(object):
+    """
+    订阅信息的条件请求
+    每个线程各用一个 requests.Session（连接池 + keep-alive，不必每次重新 TLS 握手；Session 不是线程安全的），
+    记录每个地址的 ETag/Last-Modified，服务器返回 304 时不下载正文；
+    正文的摘要与上次相同时也跳过处理（不解密、不写盘）
+    download() 只下载不修改任何共享状态，可以在线程池中执行并被放弃；
+    处理正文和 record() 由调用方在拿到结果后执行
+    """
+    def __init__(self,timeout:float = 10,session_factory = requests.Session) -> None:
+        self.session_factory = session_factory
+        self.local = local()
+        self.timeout = timeout
+        self.validators:dict[str,dict[str,str]] = {}  # url -> {"etag","last_modified","digest"}
+        self.bytes_in = 0  # 本轮下载的正文字节数
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self.local,"session",None)
+        if session is None:
+            session = self.local.session = self.session_factory()
+        return session
+
+    def download(self,url:str,timeout:float|None = None) -> tuple[str,bytes|None,dict]:
+        """
+        请求 url，不修改 validators/bytes_in
+
+        Returns:
+            tuple: (状态, 正文, 新的 validators)，状态为 "not-modified"（304，正文为 None）/
+                   "unchanged"（摘要相同）/ "updated"
+        """
+        cached = self.validators.get(url,{})
+        headers = {}
+        if "etag" in cached:
+            headers["If-None-Match"] = cached["etag"]
+        if "last_modified" in cached:
+            headers["If-Modified-Since"] = cached["last_modified"]
+        response = self.session.get(url,headers=headers,timeout=timeout or self.timeout)
+        if response.status_code == 304:
+            return "not-modified",None,cached
+        response.raise_for_status()
+        body = response.content
+        validators = {"digest":hashlib.sha256(body).hexdigest()}
+        if response.headers.get("ETag"):
+            validators["etag"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            validators["last_modified"] = response.headers["Last-Modified"]
+        status = "unchanged" if cached.get("digest") == validators["digest"] else "updated"
+        return status,body,validators
+
+    def record(self,url:str,body:bytes|None,validators:dict) -> None:
+        """正文处理成功后记录新的 ETag/摘要；处理失败时不调用，下一轮会重新下载"""
+        if body is not None:
+            self.bytes_in += len(body)
+            self.validators[url] = validators
+
+    def fetch(self,url:str,process,timeout:float|None = None) -> str:
+        """
+        同步请求 url，内容有变化时调用 process(body:bytes)
+
+        Returns:
+            str: "not-modified" / "unchanged" / "updated"
+        """
+        status,body,validators = self.download(url,timeout)
+        if status == "updated":
+            process(body)
+        self.record(url,body,validators)
+        return status
+
 class gost_subscribe(object):
     """
     gost订阅管理类
     负责从网络获取加密的配置信息，解密后保存到本地，并管理gost进程的启动和重启
     """
-    def __init__(self,web_cfg_interval:int = 300,key:bytes = b'FMa8ZBISFRcOM_gZN2uatCf8-nW-d0SGghW__T4zRdw=') -> None:
+    def __init__(self,web_cfg_interval:int = 300,key:bytes = b'FMa8ZBISFRcOM_gZN2uatCf8-nW-d0SGghW__T4zRdw=',
+                 endpoints:list[dict]|None = None,endpoints_file:str = "data/endpoints.json") -> None:
         """
         初始化gost订阅管理器
         
         Args:
             web_cfg_interval (int): 配置更新检查间隔，默认300秒(5分钟)
             key (bytes): 解密密钥，默认使用固定密钥
+            endpoints (list[dict]): 订阅地址列表，格式见 DEFAULT_ENDPOINTS
+            endpoints_file (str): 未指定 endpoints 时从该 json 文件读取，文件不存在则使用 DEFAULT_ENDPOINTS
         """
         self.gost_reboot_sgin = Event()  # 用于通知gost进程重启的事件信号
         self.web_cfg_interval = web_cfg_interval  # 配置更新检查间隔
         self.key = key  # 解密密钥
+        self.cipher = SubscriptionCipher(key)  # 复用的解密对象
+        self.fetcher = SubscriptionFetcher()  # 共用连接并做条件请求
+        self.endpoints = self.load_endpoints(endpoints,endpoints_file)
+        # gost 隧道配置的路径取自名为 gost 的订阅地址，写入和读取的是同一个文件
+        self.gost_info_path = next((endpoint["path"] for endpoint in self.endpoints if endpoint["name"] == "gost"),DEFAULT_GOST_INFO)
+        self.fetch_deadline = 60  # 一轮检查的总时限，超时未完成的请求被取消
+        self.gost_check_interval = 30  # 无配置变化时检查gost隧道存活的间隔
+        # 请求在独立的线程池中执行：被取消的请求在后台自行超时结束，asyncio.run 退出时不必等它
+        self.fetch_executor = ThreadPoolExecutor(max_workers=8,thread_name_prefix="subscribe")
         
         self.task_web_req = Thread(target=self.run,args=(self.gost_reboot_sgin,))
         self.task_gost_run = Thread(target=self.run_gost,args=(self.gost_reboot_sgin,))
@@ -71,8 +334,8 @@ class gost_subscribe(object):
         """
         if not key:
             key = Fernet.generate_key()
-        cipher_text = Fernet(key).encrypt(text.encode())
-        return base64.b64encode(cipher_text).decode()
+        cipher = self.cipher if key == self.key else SubscriptionCipher(key)
+        return cipher.encrypt_bytes(text.encode()).decode()
 
     def hard_decrypt(self,text:str,key =None)->str:
         """
@@ -87,19 +350,41 @@ class gost_subscribe(object):
         """
         if not key:
             key = Fernet.generate_key()
-        cipher_text = base64.b64decode(text.encode())
-        return Fernet(key).decrypt(cipher_text).decode()
+        cipher = self.cipher if key == self.key else SubscriptionCipher(key)
+        return cipher.decrypt_bytes(text.encode()).decode()
 
 
+    def load_endpoints(self,endpoints:list[dict]|None,endpoints_file:str) -> list[dict]:
+        """
+        读取订阅地址列表，并补全 timeout/retries/backoff 的默认值
+        
+        Returns:
+            list[dict]: 订阅地址列表
+
+        Raises:
+            ValueError: 某个地址缺少 name/url/path
+        """
+        if endpoints is None:
+            if os.path.exists(endpoints_file):
+                with open(endpoints_file,encoding="utf-8") as fd:
+                    endpoints = json.load(fd)
+            else:
+                endpoints = DEFAULT_ENDPOINTS
+        for i,endpoint in enumerate(endpoints):
+            missing = [key for key in ENDPOINT_REQUIRED if not endpoint.get(key)]
+            if missing:
+                raise ValueError(f"订阅地址 #{i} 缺少 {', '.join(missing)}: {endpoint!r}")
+        return [{**ENDPOINT_DEFAULTS,**endpoint} for endpoint in endpoints]
+
     def config_init(self,)->list[str]:
         """
         初始化配置信息
-        从data/gost_info文件中读取gost启动参数
+        从 gost 订阅地址的 path（默认 data/gost_info）中读取gost启动参数
         
         Returns:
             list[str]: gost启动参数列表
         """
-        with open("data/gost_info",mode="r",) as fd:
+        with open(self.gost_info_path,mode="r",) as fd:
             start_cfg :list = []
             data = fd.readline()
             while (data!=''):
@@ -108,6 +393,27 @@ class gost_subscribe(object):
         return start_cfg
 
 
+    def apply_gost_info(self,reconciler:GostReconciler) -> dict[str,list[str]]|None:
+        """
+        按 gost_info 调整隧道
+        新配置不可用（解析不出任何隧道，或全部隧道启动失败）时用 .bak 恢复上一个版本并重新调整一次；
+        没有可用的备份时，解析不出隧道的配置不会被应用，正在运行的隧道保持不变
+
+        Returns:
+            dict|None: GostReconciler.reconcile 的结果，配置未被应用时为 None
+        """
+        specs = GostReconciler.parse(self.config_init())
+        result = reconciler.reconcile(specs) if specs else None
+        if result is not None and (not result["failed"] or result["started"] or result["replaced"] or result["unchanged"]):
+            return result
+        reason = "没有任何隧道" if result is None else "全部隧道启动失败"
+        if not AtomicConfigFile(self.gost_info_path).rollback():
+            self.msg_out(f"gost配置不可用（{reason}），没有可恢复的备份\n")
+            return result
+        self.msg_out(f"gost配置不可用（{reason}），已恢复上一个版本\n")
+        specs = GostReconciler.parse(self.config_init())
+        return reconciler.reconcile(specs) if specs else result
+
     def run_gost(self,reboot_sgin:Event) -> None:
         """
         运行gost进程
@@ -122,18 +428,23 @@ class gost_subscribe(object):
             self.msg_out(f"gost进程已结束\n")
         except Exception as e:
             self.msg_out(f"{e}\n")
-        last_cfg = self.config_init()#gost运行参数
+        reconciler = GostReconciler()
         while True:
-            data = self.config_init()#gost命令参数个数
-            a :list[Popen] =[]
-            for i in range(len(data)):
-                a.append(Popen(args=data[i].split(" "),creationflags=CREATE_NO_WINDOW),)
-            self.msg_out(f"gost进程已更新\n")
+            # 先清除信号再读取配置，读取期间到达的更新不会丢失
             reboot_sgin.clear()
-            reboot_sgin.wait()
-            time.sleep(3)
-            for i in a:
-                i.terminate()
+            try:
+                result = self.apply_gost_info(reconciler)
+            except Exception as e:
+                # 配置文件缺失、无法读取等：本线程不能退出，等下一次更新或检查时重试
+                self.msg_out(f"gost配置处理失败:{e!r}\n")
+                result = None
+            if result is not None:
+                if result["started"] or result["replaced"] or result["stopped"]:
+                    self.msg_out(f"gost进程已更新：新启动{result['started']} 替换{result['replaced']} 停止{result['stopped']} 未变化{len(result['unchanged'])}个\n")
+                for key in result["failed"]:
+                    self.msg_out(f"gost隧道{key}启动失败:{reconciler.errors[key]}\n")
+            # 配置变化时立即处理，否则定期检查一次，重新拉起意外退出的隧道
+            reboot_sgin.wait(self.gost_check_interval)
             
     # 从网页上获取加密的订阅信息
     def renew_cfg(self,reboot_sgin:Event,last_cfg:list[str]) -> None:
@@ -145,26 +456,89 @@ class gost_subscribe(object):
             reboot_sgin (Event): 重启信号事件
             last_cfg (list[str]): 上一次的配置信息
         """
-        try:
-            a = requests.get("https://webcfg.cfg.novalplay.com").text
-            with open(r"data\flying.yaml", "w",encoding="utf-8") as fd:
-                content = self.hard_decrypt(a,self.key)
-                fd.write(content)
-                self.msg_out(f"clash订阅信息更新成功：{time.strftime('%Y-%m-%d %H:%M:%S',time.localtime())}")
-        except Exception as e:
-            self.msg_out(f"clash订阅信息更新失败:{e}\n若一直出现，请检查能否访问：https://webcfg.cfg.novalplay.com")
-        try:
-            a = requests.get("https://cmdline.cfg.novalplay.com").text
-            with open(r"data\gost_info", "w") as fd:
-                content = self.hard_decrypt(a,self.key)
-                fd.write(content)
-                if last_cfg[0] != content:#配置文件有更新
+        cpu_start = time.process_time()
+        self.fetcher.bytes_in = 0
+
+        def saver(endpoint:dict):
+            def save(body:bytes) -> None:
+                # 先解密，成功后才原子替换文件；解密失败时原文件保持不变
+                plain = self.cipher.decrypt_bytes(body)  # 明文为 UTF-8
+                encoding = endpoint.get("encoding") or locale.getpreferredencoding(False)
+                data = plain if codecs.lookup(encoding).name == "utf-8" else plain.decode().encode(encoding)
+                if not AtomicConfigFile(endpoint["path"]).write(data):
+                    self.msg_out(f"{endpoint['name']}解密后的内容与本地文件相同，未写入")
+                if endpoint["name"] != "gost":
+                    return
+                content = plain.decode()
+                # 文件关闭后再通知重启，run_gost 不再需要先等待几秒才读取配置
+                # 只比较解析后的隧道，空行、行尾空白等变化不触发重启
+                if GostReconciler.parse(last_cfg[0].splitlines()) != GostReconciler.parse(content.splitlines()):
                     last_cfg[0] = content
-                    reboot_sgin.set()    
+                    reboot_sgin.set()
                     self.msg_out(f"gost配置文件发生变更:{last_cfg[0]}")
-                self.msg_out(f"gost获取更新信息成功：{time.strftime('%Y-%m-%d %H:%M:%S',time.localtime())}")
-        except Exception as e:
-            self.msg_out(f"gost获取更新信息失败:{e}\n若一直出现，请检查能否访问：https://cmdline.cfg.novalplay.com")
+            return save
+
+        results = asyncio.run(self.fetch_all({endpoint["name"]:saver(endpoint) for endpoint in self.endpoints}))
+        for endpoint in self.endpoints:
+            status = results[endpoint["name"]]
+            if isinstance(status,BaseException):
+                self.msg_out(f"{endpoint['name']}订阅信息更新失败:{status!r}\n若一直出现，请检查能否访问：{endpoint['url']}")
+            else:
+                self.msg_out(f"{endpoint['name']}订阅信息检查成功({status})：{time.strftime('%Y-%m-%d %H:%M:%S',time.localtime())}")
+        self.msg_out(f"本轮订阅检查：下载{self.fetcher.bytes_in}字节，CPU耗时{(time.process_time() - cpu_start) * 1000:.1f}ms")
+
+    async def fetch_endpoint(self,endpoint:dict,process) -> str:
+        """
+        获取一个订阅地址，失败后按指数退避重试
+        阻塞的下载放到 fetch_executor 中执行，超时或取消时放弃该线程的结果；
+        解密、写盘和重启通知只在事件循环中、下载成功后执行，被放弃的线程不会再改动任何状态
+        
+        Returns:
+            str: SubscriptionFetcher.download 的状态
+        """
+        for attempt in range(endpoint["retries"] + 1):
+            try:
+                request = asyncio.get_running_loop().run_in_executor(self.fetch_executor,self.fetcher.download,endpoint["url"],endpoint["timeout"])
+                status,body,validators = await asyncio.wait_for(request,endpoint["timeout"])
+                if status == "updated":
+                    process(body)
+                self.fetcher.record(endpoint["url"],body,validators)
+                return status
+            except Exception as e:
+                if attempt == endpoint["retries"]:
+                    raise
+                delay = endpoint["backoff"] * 2 ** attempt
+                self.msg_out(f"{endpoint['name']}订阅获取失败（第{attempt + 1}次）:{e!r}，{delay:.1f}秒后重试")
+                await asyncio.sleep(delay)
+
+    async def fetch_all(self,processes:dict) -> dict:
+        """
+        并发获取全部订阅地址，一个地址慢不会拖住其他地址
+        超过 fetch_deadline 仍未完成的请求被取消
+        
+        Args:
+            processes (dict): 名称 -> 内容变化时的处理函数 process(body:bytes)
+            
+        Returns:
+            dict: 名称 -> 结果字符串，失败时为异常对象
+        """
+        if not self.endpoints:
+            return {}  # asyncio.wait 不接受空集合
+        tasks = {endpoint["name"]:asyncio.create_task(self.fetch_endpoint(endpoint,processes[endpoint["name"]])) for endpoint in self.endpoints}
+        done,pending = await asyncio.wait(tasks.values(),timeout=self.fetch_deadline)
+        for task in pending:
+            task.cancel()
+        results = {}
+        for name,task in tasks.items():
+            if task in pending:
+                results[name] = TimeoutError(f"超过{self.fetch_deadline}秒未完成，已取消")
+            elif task.exception() is not None:
+                results[name] = task.exception()
+            else:
+                results[name] = task.result()
+        if pending:
+            await asyncio.wait(pending)
+        return results
 
     def run(self,gost_reboot_sgin:Event) -> None:
         """
@@ -175,7 +549,10 @@ class gost_subscribe(object):
             gost_reboot_sgin (Event): gost重启信号
         """
 
-        last_cfg:list[str] = ["default"]
+        # 以本地已有的配置为基准，启动时配置没变就不通知重启
+        last_cfg:list[str] = [""]
+        if os.path.exists(self.gost_info_path):
+            last_cfg[0] = "".join(self.config_init())
         self.renew_cfg(gost_reboot_sgin,last_cfg)
         while True:
             self.msg_out("http服务已更新")
@@ -0,0 +1,34 @@
+"""子进程相关的小工具，不依赖 asyncio 和 Qt"""
+import time
+
+
+def terminate_all(processes, timeout:float = 5.0) -> dict:
+    """
+    并行结束一组 subprocess.Popen：先同时发送 terminate，再在同一个截止时间前一起等待，
+    到期仍未退出的进程 kill，最后逐个 wait() 回收，不留僵尸进程
+    总耗时不超过 timeout（加上 kill 之后的回收时间），而不是每个进程各等 timeout
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    pending = [process for process in processes if process.poll() is None]
+    for process in pending:
+        try:
+            process.terminate()
+        except OSError:
+            pass# 进程恰好已经退出
+    delay = 0.005
+    while pending:
+        pending = [process for process in pending if process.poll() is None]# poll() 同时回收已退出的进程
+        remaining = deadline - time.monotonic()
+        if not pending or remaining <= 0:
+            break
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.1)
+    for process in pending:
+        try:
+            process.kill()
+        except OSError:
+            pass
+    for process in pending:
+        process.wait()
+    return {"stopped": len(processes), "killed": len(pending), "elapsed": round(time.monotonic() - start, 3)}
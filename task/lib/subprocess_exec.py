@@ -8,6 +8,10 @@ from PySide6.QtGui import (
     QIcon, QBrush, QPen, QFont, QImage, QRegion
 )
 import sys
+import time
+from .uni_panel.log_buffer import LogRingBuffer
+from .uni_panel.log_view import LogView
+from .uni_panel.stream_decoder import StreamDecoder
 
 class config_widget(QWidget):
     def __init__(self,parent=None):
@@ -43,8 +47,18 @@ class base_cmd_cexecute(QWidget):
         hlayout2.addWidget(self.taskCmdLine)
 
 
-        self.cmd_wid = QTextBrowser()
-        self.cmd_wid.setFontPointSize(30)
+        # 日志只存在环形缓冲区中，虚拟化视图只绘制可见的行
+        self.log = LogRingBuffer()
+        self.cmd_wid = LogView(self.log)
+        # 输出先增量解码成完整的行，攒到 pending 中，由定时器合并成一次追加
+        self.stdout_decoder = StreamDecoder()
+        self.stderr_decoder = StreamDecoder()
+        self.pending = []
+        self.partial_timeout = 0.2# 没有换行符的输出等待多久后直接显示
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(30)
+        self.flush_timer.timeout.connect(self.flush_pending)
 
         
         self.start_button = QPushButton("start")
@@ -67,25 +81,51 @@ class base_cmd_cexecute(QWidget):
     def start_cmd(self):
         if not self.p:
             self.p = QProcess()
+            # 每次启动重新检测编码
+            self.stdout_decoder = StreamDecoder()
+            self.stderr_decoder = StreamDecoder()
             self.p.readyReadStandardOutput.connect(self.handle_output)
             self.p.readyReadStandardError.connect(self.handle_error)
             self.p.finished.connect(self.handle_finish)
             self.p.start("python",[self.exec_cmd])
-            self.cmd_wid.append("starting...")
+            self.message("starting...")
 
     def handle_output(self):
-        data = self.p.readAllStandardOutput()
-        data = bytes(data).decode(sys.stdout.encoding)
-        self.message(data)
+        self.pending.extend(self.stdout_decoder.feed(bytes(self.p.readAllStandardOutput())))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
     def handle_error(self):
-        data = self.p.readAllStandardError()
-        data = bytes(data).decode(sys.stdout.encoding)
-        self.message(data)
+        self.pending.extend(self.stderr_decoder.feed(bytes(self.p.readAllStandardError())))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush_pending(self, final:bool = False):
+        """把攒下的行一次性写入日志；final 为 True 时连同未结束的行和残缺字节一起输出"""
+        now = time.monotonic()
+        waiting = False
+        for decoder in (self.stdout_decoder, self.stderr_decoder):
+            if not decoder.partial and not final:
+                continue
+            if final or now - decoder.partial_since >= self.partial_timeout:
+                self.pending.extend(decoder.flush(final))
+            else:
+                waiting = True
+        if self.pending:
+            self.log.extend(self.pending)
+            self.pending = []
+            self.cmd_wid.notify_appended()
+        if waiting and not self.flush_timer.isActive():
+            self.flush_timer.start()
 
     def handle_finish(self):
-        self.cmd_wid.append("finished")
+        self.handle_output()
+        self.handle_error()
+        self.flush_pending(final=True)
+        self.message("finished")
     def message(self,data):
-        self.cmd_wid.append(data)
+        self.flush_pending()# 保持与子进程输出的先后顺序
+        self.log.extend(data.splitlines() or [""])
+        self.cmd_wid.notify_appended()
 
 
 if __name__ == "__main__":
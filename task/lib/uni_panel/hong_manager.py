@@ -0,0 +1,184 @@
+import re
+import threading
+import time
+
+try:
+    from re import _parser as sre_parse
+except ImportError:# Python < 3.11
+    import sre_parse
+
+
+MIN_LITERAL = 3# 必需字面量短于此长度的规则不参与预筛选，每行都单独匹配
+
+
+def required_literal(pattern:str, flags:int = 0) -> str:
+    """
+    找出规则匹配时必定出现的最长连续字面量，用于预筛选
+    只看最外层的顺序结构（包括其中的分组），遇到分支、重复、字符集等即断开；忽略大小写的规则返回空串
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    if parsed.state.flags & re.IGNORECASE:
+        return ""
+    best = ""
+    run = []
+
+    def close_run() -> None:
+        nonlocal best
+        if len(run) > len(best):
+            best = "".join(run)
+        run.clear()
+
+    def walk(items) -> None:
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                run.append(chr(av))
+            elif op is sre_parse.SUBPATTERN and not av[1] & re.IGNORECASE:
+                walk(av[-1])# 不重复的分组本身也是必需的，字面量可以跨分组连续
+            else:
+                close_run()
+
+    walk(parsed)
+    close_run()
+    return best
+
+
+def trie_pattern(words) -> str:
+    """把一组字面量构造成前缀树形状的正则，每个位置只需沿一条分支比较，速度与字面量个数基本无关"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body# 贪婪可选，优先匹配更长的字面量
+
+    return build(trie)
+
+
+class MacroRule():
+    """
+    一条宏规则：输出行匹配 pattern 时执行 action
+    action:
+        "restart"   重启产生该输出的任务（target 不为空时重启 target），经过重启策略的退避和熔断
+        "set_var"   把匹配到的命名分组存入 MacroEngine.variables[任务名]
+        callable    action(event:dict)，event 包含 rule/task/stream/line/groups
+    tasks/streams 为 None 表示不限制；cooldown 秒内同一任务只触发一次
+    """
+    ACTIONS = ("restart", "set_var")
+    def __init__(self, name:str, pattern:str, action, tasks=None, streams=None, flags:int = 0,
+                 target:str|None = None, cooldown:float = 0.0):
+        if not callable(action) and action not in self.ACTIONS:
+            raise ValueError(f"unknown macro action: {action}")
+        self.name = name
+        self.pattern = pattern
+        self.regex = re.compile(pattern, flags)
+        self.flags = flags
+        self.action = action
+        self.tasks = set(tasks) if tasks is not None else None
+        self.streams = set(streams) if streams is not None else None
+        self.target = target
+        self.cooldown = cooldown
+        self.last_fired:dict[str, float] = {}
+        self.hits = 0
+        literal = required_literal(pattern, flags)
+        self.literal = literal if len(literal) >= MIN_LITERAL else ""
+
+    def accepts(self, task_name:str, stream_name:str) -> bool:
+        return (self.tasks is None or task_name in self.tasks) and (self.streams is None or stream_name in self.streams)
+
+
+class MacroEngine():
+    """
+    宏（触发器）引擎：对子进程输出逐行匹配规则并执行动作
+    每条规则取出匹配时必定出现的字面量，全部字面量合并成一个前缀树形状的正则，
+    每行只扫描一遍即可得到候选规则，扫描速度与规则数量基本无关；
+    只有候选规则（以及没有可用字面量的规则）才用各自的表达式完整匹配并提取分组
+    一行可以触发多条规则，按添加顺序执行
+    """
+    def __init__(self, manager = None):
+        self.manager = manager# ProcessManager，restart 动作需要
+        self.rules:list[MacroRule] = []
+        self.variables:dict[str, dict[str, str]] = {}
+        self.lock = threading.Lock()
+        self.compiled = (None, {}, frozenset(), [])# (字面量扫描表达式, 字面量 -> 候选规则序号, 每行都要匹配的规则序号, 规则)
+        self.lines = 0
+
+    def add_rule(self, name:str, pattern:str, action, **options) -> MacroRule:
+        rule = MacroRule(name, pattern, action, **options)
+        with self.lock:
+            self.rules = [r for r in self.rules if r.name != name] + [rule]
+            self.compile()
+        return rule
+
+    def remove_rule(self, name:str) -> None:
+        with self.lock:
+            self.rules = [r for r in self.rules if r.name != name]
+            self.compile()
+
+    def compile(self) -> None:
+        """重新生成扫描表达式，整体替换 compiled，匹配线程无需加锁"""
+        literals:dict[str, set[int]] = {}
+        always = set()
+        for index, rule in enumerate(self.rules):
+            if rule.literal:
+                literals.setdefault(rule.literal, set()).add(index)
+            else:
+                always.add(index)
+        # 扫描在每个位置只取最长的字面量，因此命中一个字面量时，以它的前缀为字面量的规则也是候选
+        candidates = {}
+        for literal in literals:
+            prefixes = [literals[literal[:n]] for n in range(MIN_LITERAL, len(literal) + 1) if literal[:n] in literals]
+            candidates[literal] = frozenset().union(*prefixes)
+        scanner = re.compile(trie_pattern(literals)) if literals else None
+        self.compiled = (scanner, candidates, frozenset(always), list(self.rules))
+
+    def match_line(self, task_name:str, stream_name:str, line:str) -> list[tuple[MacroRule, re.Match]]:
+        scanner, candidates, always, rules = self.compiled
+        indexes = always
+        if scanner is not None:
+            hit = scanner.search(line)
+            if hit is not None:
+                indexes = set(always)
+                while hit is not None:
+                    indexes.update(candidates[hit.group()])
+                    hit = scanner.search(line, hit.start() + 1)# 从下一个字符继续，重叠的字面量也不会漏掉
+        result = []
+        for index in sorted(indexes):
+            rule = rules[index]
+            if rule.accepts(task_name, stream_name):
+                match = rule.regex.search(line)
+                if match is not None:
+                    result.append((rule, match))
+        return result
+
+    def process(self, task_name:str, stream_name:str, lines) -> None:
+        for line in lines:
+            self.lines += 1
+            for rule, match in self.match_line(task_name, stream_name, line):
+                self.fire(rule, task_name, stream_name, line, match)
+
+    def fire(self, rule:MacroRule, task_name:str, stream_name:str, line:str, match:re.Match) -> None:
+        if rule.cooldown:
+            now = time.monotonic()
+            if now - rule.last_fired.get(task_name, -rule.cooldown) < rule.cooldown:
+                return
+            rule.last_fired[task_name] = now
+        rule.hits += 1
+        groups = match.groupdict()
+        if rule.action == "set_var":
+            self.variables.setdefault(task_name, {}).update(groups if groups else {rule.name: match.group(0)})
+        elif rule.action == "restart":
+            if self.manager is not None:
+                # 不用 restart_task()：手动重启会清空熔断计数，反复出现的错误输出会造成无间隔的重启循环
+                self.manager.request_restart(rule.target or task_name, reason=f"macro:{rule.name}")
+        else:
+            rule.action({"rule": rule.name, "task": task_name, "stream": stream_name, "line": line, "groups": groups})
+
+    def get_var(self, task_name:str, name:str, default = None):
+        return self.variables.get(task_name, {}).get(name, default)
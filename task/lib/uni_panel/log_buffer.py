@@ -0,0 +1,148 @@
+import threading
+from array import array
+
+
+class LogRingBuffer():
+    """
+    固定容量的日志环形缓冲区，作为每个任务日志的唯一数据源
+    行内容以 UTF-8 连续存放在预分配的 bytearray 中，每行的起始偏移与长度存放在 array 中；
+    写满（字节数或行数）后覆盖最旧的行，内存占用恒定，追加为 O(1)
+    行号：index 为当前缓冲区内的相对行号（0 为最旧的一行），seq 为自创建以来的绝对行号
+    """
+    def __init__(self, capacity_bytes:int = 4 * 1024 * 1024, max_lines:int = 65536):
+        self.capacity = capacity_bytes
+        self.max_lines = max_lines
+        self.data = bytearray(capacity_bytes)
+        self.offsets = array("q", bytes(8 * max_lines))# 每行在数据流中的绝对字节偏移
+        self.lengths = array("i", bytes(4 * max_lines))
+        self.first = 0# 最旧一行的 seq
+        self.total = 0# 下一行的 seq，即累计写入的行数
+        self.write_pos = 0# 累计写入的字节数
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.total - self.first
+
+    def append(self, line:str) -> None:
+        raw = line.encode("utf-8", errors="replace")
+        if len(raw) > self.capacity:
+            raw = raw[-self.capacity:]
+        with self.lock:
+            self._append(raw)
+
+    def extend(self, lines) -> None:
+        encoded = [line.encode("utf-8", errors="replace")[-self.capacity:] for line in lines]
+        with self.lock:
+            for raw in encoded:
+                self._append(raw)
+
+    def _append(self, raw:bytes) -> None:
+        size = len(raw)
+        # 淘汰最旧的行：行数已满，或新行会覆盖到它的字节
+        limit = self.write_pos + size - self.capacity
+        while self.total - self.first >= self.max_lines or (self.total > self.first and self.offsets[self.first % self.max_lines] < limit):
+            self.first += 1
+        start = self.write_pos % self.capacity
+        end = start + size
+        if end <= self.capacity:
+            self.data[start:end] = raw
+        else:
+            split = self.capacity - start
+            self.data[start:] = raw[:split]
+            self.data[:size - split] = raw[split:]
+        slot = self.total % self.max_lines
+        self.offsets[slot] = self.write_pos
+        self.lengths[slot] = size
+        self.total += 1
+        self.write_pos += size
+
+    def _raw(self, seq:int) -> bytes:
+        slot = seq % self.max_lines
+        start = self.offsets[slot] % self.capacity
+        end = start + self.lengths[slot]
+        if end <= self.capacity:
+            return bytes(self.data[start:end])
+        return bytes(self.data[start:]) + bytes(self.data[:end - self.capacity])
+
+    def line(self, index:int) -> str:
+        with self.lock:
+            count = self.total - self.first
+            if index < 0:
+                index += count
+            if not 0 <= index < count:
+                raise IndexError("log line index out of range")
+            return self._raw(self.first + index).decode("utf-8", errors="replace")
+
+    def lines(self, start:int, stop:int) -> list[str]:
+        """相对行号 [start, stop) 的行，超出范围的部分自动截断"""
+        with self.lock:
+            count = self.total - self.first
+            start = max(0, start)
+            stop = min(count, stop)
+            return [self._raw(self.first + index).decode("utf-8", errors="replace") for index in range(start, stop)]
+
+    def tail(self, n:int) -> list[str]:
+        with self.lock:
+            count = self.total - self.first
+            return [self._raw(seq).decode("utf-8", errors="replace") for seq in range(self.total - min(n, count), self.total)]
+
+    def _seq_at(self, pos:int) -> int:
+        """二分查找绝对字节偏移 pos 所在的行"""
+        low, high = self.first, self.total - 1
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.offsets[mid % self.max_lines] <= pos:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+
+    def search(self, needle:str, limit:int|None = None) -> list[tuple[int, str]]:
+        """
+        子串搜索，返回 [(相对行号, 行内容)]，按从旧到新排列
+        直接在连续的字节区上用 bytearray.find 查找，再二分定位所在行，不逐行解码
+        """
+        pattern = needle.encode("utf-8")
+        results = []
+        if not pattern:
+            return results
+        with self.lock:
+            if self.total == self.first:
+                return results
+            begin = self.offsets[self.first % self.max_lines]
+            last_seq = -1
+            # 有效数据在绝对区间 [begin, write_pos)，在物理上最多分成两段
+            for seg_begin in range(begin - begin % self.capacity, self.write_pos, self.capacity):
+                seg_start = max(begin, seg_begin)
+                seg_end = min(self.write_pos, seg_begin + self.capacity)
+                phys = seg_start - seg_begin
+                pos = self.data.find(pattern, phys, phys + seg_end - seg_start)
+                while pos != -1:
+                    absolute = seg_begin + pos
+                    seq = self._seq_at(absolute)
+                    slot = seq % self.max_lines
+                    line_end = self.offsets[slot] + self.lengths[slot]
+                    if absolute + len(pattern) <= line_end:
+                        if seq != last_seq:
+                            last_seq = seq
+                            results.append((seq - self.first, self._raw(seq).decode("utf-8", errors="replace")))
+                            if limit is not None and len(results) >= limit:
+                                return results
+                        next_pos = line_end - seg_begin
+                    else:
+                        next_pos = pos + 1# 匹配跨越了行边界，不算命中
+                    pos = self.data.find(pattern, next_pos, phys + seg_end - seg_start) if next_pos < phys + seg_end - seg_start else -1
+                # 跨越物理边界的那一行单独检查
+                if seg_end == seg_begin + self.capacity and seg_end < self.write_pos:
+                    seq = self._seq_at(seg_end - 1)
+                    slot = seq % self.max_lines
+                    if seq != last_seq and self.offsets[slot] + self.lengths[slot] > seg_end and pattern in self._raw(seq):
+                        last_seq = seq
+                        results.append((seq - self.first, self._raw(seq).decode("utf-8", errors="replace")))
+                        if limit is not None and len(results) >= limit:
+                            return results
+        return results
+
+    def clear(self) -> None:
+        with self.lock:
+            self.first = self.total
@@ -0,0 +1,76 @@
+from PySide6.QtWidgets import QAbstractScrollArea
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QPainter, QFontDatabase, QFontMetrics
+
+
+class LogView(QAbstractScrollArea):
+    """
+    虚拟化的日志视图：直接从 LogRingBuffer 读取，只绘制可见的行，不维护文档布局
+    新数据通过 notify_appended() 通知，多次通知合并为每帧最多一次刷新；
+    滚动条停在底部时自动跟随最新输出
+    只能在 GUI 线程中调用
+    """
+    def __init__(self, log_buffer, parent=None, frame_interval:int = 16):
+        super().__init__(parent)
+        self.log = log_buffer
+        self.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.follow = True# 是否自动滚动到底部
+        self.top_seq = 0# 视图顶部那一行的绝对行号，日志被淘汰时保持视图不跳动
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(frame_interval)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+        self.refresh()
+
+    def set_buffer(self, log_buffer) -> None:
+        self.log = log_buffer
+        self.follow = True
+        self.refresh()
+
+    def notify_appended(self) -> None:
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+
+    def line_height(self) -> int:
+        return QFontMetrics(self.font()).lineSpacing()
+
+    def visible_lines(self) -> int:
+        return max(1, self.viewport().height() // self.line_height())
+
+    def refresh(self) -> None:
+        """按缓冲区当前行数更新滚动条并重绘可见区域"""
+        count = len(self.log)
+        scroll_bar = self.verticalScrollBar()
+        maximum = max(0, count - self.visible_lines())
+        scroll_bar.blockSignals(True)
+        scroll_bar.setRange(0, maximum)
+        scroll_bar.setPageStep(self.visible_lines())
+        if self.follow:
+            scroll_bar.setValue(maximum)
+        else:
+            scroll_bar.setValue(min(maximum, max(0, self.top_seq - self.log.first)))
+        scroll_bar.blockSignals(False)
+        self.top_seq = self.log.first + scroll_bar.value()
+        self.viewport().update()
+
+    def on_scrolled(self, value:int) -> None:
+        scroll_bar = self.verticalScrollBar()
+        self.follow = value >= scroll_bar.maximum()
+        self.top_seq = self.log.first + value
+        self.viewport().update()
+
+    def resizeEvent(self, event) -> None:
+        super().resizeEvent(event)
+        self.refresh()
+
+    def paintEvent(self, event) -> None:
+        painter = QPainter(self.viewport())
+        painter.fillRect(event.rect(), self.palette().base())
+        painter.setPen(self.palette().text().color())
+        line_height = self.line_height()
+        ascent = QFontMetrics(self.font()).ascent()
+        start = self.verticalScrollBar().value()
+        for row, text in enumerate(self.log.lines(start, start + self.visible_lines() + 1)):
+            painter.drawText(4, row * line_height + ascent, text)
@@ -1,52 +1,638 @@
-import subprocess
-import sys
+import asyncio
 import os
-from PySide6.QtWidgets import (
-    QApplication, QWidget, QLabel, QHBoxLayout, QMenu,
-    QSystemTrayIcon, QStyle, QPushButton, QListWidget, QListWidgetItem, QVBoxLayout, QStackedWidget, QLineEdit, QLayout, QFormLayout, QPlainTextEdit
-)
-from PySide6.QtCore import Qt, QTimer, QPoint, QRectF, Signal, QThread, QPropertyAnimation, QEasingCurve, QBuffer, QRect
-from PySide6.QtGui import (
-    QPainter, QColor, QAction, QPixmap, QGuiApplication,
-    QIcon, QBrush, QPen, QFont, QImage, QRegion, 
-)
-
-from queue import Queue
+import random
+import shlex
+import sys
 import threading
+import time
+from collections import deque
+from queue import Empty, Queue
+
+from .hong_manager import MacroEngine
+from .log_buffer import LogRingBuffer
+from .stream_decoder import StreamDecoder
+
+
+class BatchQueue():
+    """
+    有界的批量输出队列，元素为一批输出 (task_name, stream_name, [lines])
+    队列满时的处理方式 overflow：
+        block           生产者等待（子进程管道随之写满，形成背压）
+        drop-oldest     丢弃最旧的一批，为新数据腾出位置
+        drop-and-count  丢弃新的一批，只计数
+    非 tuple 的元素是控制消息（如 msg_handler 的结束标记 "9527"），不占容量、不会被丢弃，也不会阻塞
+    on_ready() 在队列由空变为非空时于生产者线程中调用（不持有锁），
+    供 GUI 等消费者以事件驱动的方式唤醒，替代定时轮询
+    """
+    POLICIES = ("block", "drop-oldest", "drop-and-count")
+    def __init__(self, maxsize:int = 1024, overflow:str = "drop-oldest", on_ready = None):
+        if overflow not in self.POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.on_ready = on_ready
+        self.items = deque()
+        self.controls = 0# 队列中控制消息的个数
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.not_full = threading.Condition(self.mutex)
+        # 计数器
+        self.batches = 0
+        self.lines = 0
+        self.max_batch_size = 0
+        self.max_depth = 0
+        self.dropped_batches = 0
+        self.dropped_lines = 0
+
+    @staticmethod
+    def _size(item) -> int:
+        return len(item[2]) if isinstance(item, tuple) else 0
+
+    def try_put(self, item) -> bool:
+        """不等待的写入；block 策略下队列已满时返回 False，其余策略总是返回 True"""
+        with self.mutex:
+            if isinstance(item, tuple) and self._full():
+                if self.overflow == "block":
+                    return False
+                if self.overflow == "drop-and-count":
+                    self.dropped_batches += 1
+                    self.dropped_lines += self._size(item)
+                    return True
+                self._drop_oldest()
+            became_ready = self._append(item)
+        if became_ready and self.on_ready is not None:
+            self.on_ready()
+        return True
+
+    def put(self, item, timeout:float|None = None) -> bool:
+        if self.overflow != "block" or not isinstance(item, tuple):
+            return self.try_put(item)
+        with self.mutex:
+            if not self.not_full.wait_for(lambda: not self._full(), timeout):
+                return False
+            became_ready = self._append(item)
+        if became_ready and self.on_ready is not None:
+            self.on_ready()
+        return True
+
+    def _full(self) -> bool:
+        return len(self.items) - self.controls >= self.maxsize
+
+    def _drop_oldest(self) -> None:
+        """丢弃最旧的一批输出，跳过排在前面的控制消息"""
+        for index, queued in enumerate(self.items):
+            if isinstance(queued, tuple):
+                del self.items[index]
+                self.dropped_batches += 1
+                self.dropped_lines += self._size(queued)
+                return
+
+    def _append(self, item) -> bool:
+        """写入一批，返回队列是否由空变为非空"""
+        size = self._size(item)
+        was_empty = not self.items
+        self.items.append(item)
+        if not isinstance(item, tuple):
+            self.controls += 1
+            self.not_empty.notify()
+            return was_empty
+        self.batches += 1
+        self.lines += size
+        self.max_batch_size = max(self.max_batch_size, size)
+        self.max_depth = max(self.max_depth, len(self.items))
+        self.not_empty.notify()
+        return was_empty
+
+    def get(self, block:bool = True, timeout:float|None = None):
+        with self.mutex:
+            if not block:
+                if not self.items:
+                    raise Empty
+            elif not self.not_empty.wait_for(lambda: self.items, timeout):
+                raise Empty
+            item = self.items.popleft()
+            if isinstance(item, tuple):
+                self.not_full.notify()
+            else:
+                self.controls -= 1
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return len(self.items)
+
+    def empty(self) -> bool:
+        return not self.items
+
+    def stats(self) -> dict:
+        with self.mutex:
+            return {
+                "depth": len(self.items),
+                "max_depth": self.max_depth,
+                "batches": self.batches,
+                "lines": self.lines,
+                "avg_batch_size": self.lines / self.batches if self.batches else 0,
+                "max_batch_size": self.max_batch_size,
+                "dropped_batches": self.dropped_batches,
+                "dropped_lines": self.dropped_lines,
+            }
+
 
 class msg_handler():
     """管理队列中输出的传递（交给宏处理）"""
-    def __init__(self,stdout_queue:Queue):
+    def __init__(self,stdout_queue:BatchQueue, macros:MacroEngine|None = None):
         self.queue = stdout_queue
-        pass
+        self.macros = macros
     def handle_msg(self) -> None:
         """加入线程结束处理"""
         while True:
-            line = self.queue.get()
-            if line == "9527":
+            item = self.queue.get()
+            if item == "9527":
                 break
-            pass# 宏处理
+            task_name, stream_name, lines = item
+            if self.macros is not None:
+                self.macros.process(task_name, stream_name, lines)# 宏处理
+
+
+class RestartPolicy():
+    """
+    任务退出后的重启策略
+    mode: never 不重启 / on-failure 非 0 退出码或启动失败时重启 / always 总是重启
+    重启前按带抖动的指数退避等待；运行时间达到 min_uptime 后退避次数清零；
+    crash_window 秒内快速退出（运行不足 min_uptime）达到 crash_limit 次则熔断，不再自动重启
+    """
+    MODES = ("never", "on-failure", "always")
+    def __init__(self, mode:str = "never", backoff_base:float = 1.0, backoff_max:float = 60.0, jitter:float = 0.2,
+                 min_uptime:float = 10.0, crash_limit:int = 5, crash_window:float = 60.0):
+        if mode not in self.MODES:
+            raise ValueError(f"unknown restart mode: {mode}")
+        self.mode = mode
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.min_uptime = min_uptime
+        self.crash_limit = crash_limit
+        self.crash_window = crash_window
+
+    def should_restart(self, exit_code:int|None) -> bool:
+        if self.mode == "always":
+            return True
+        if self.mode == "on-failure":
+            return exit_code != 0
+        return False
+
+    def backoff_delay(self, failures:int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(0, failures - 1))
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+class TaskState():
+    """单个任务的运行状态"""
+    def __init__(self, task_name:str, task_cmd, task_type:str, restart_policy:RestartPolicy|None = None, log:LogRingBuffer|None = None,
+                 stdin_queue_size:int = 1024):
+        self.name = task_name
+        self.cmd = task_cmd
+        self.task_type = task_type
+        self.policy = restart_policy or RestartPolicy()
+        self.log = log or LogRingBuffer()# 该任务全部输出的唯一存储，界面从这里读取
+        self.process = None
+        self.pid = None
+        self.start_time = None
+        self.started_at = None# 单调时钟，用于计算运行时长
+        self.exit_code = None
+        self.restart_count = 0
+        self.failures = 0# 连续的快速退出次数，决定退避时长
+        self.quick_exits = deque()# 熔断窗口内快速退出的时间点
+        self.restart_handle = None
+        self.restart_requested = None# request_restart() 的原因，进程退出后由 _on_exit 处理
+        self.stdin_queue = asyncio.Queue(stdin_queue_size)# 待写入子进程 stdin 的消息，只在事件循环线程中访问
+        self.stdin_writer = None
+        self.decoders:dict[str, StreamDecoder] = {}# 当前进程 stdout/stderr 各自的解码器，每次启动重新创建
+        self.status = "pending"# pending / running / backoff / exited / stopped / crash-loop
+
+    def args(self) -> list[str]:
+        """task_cmd 可以是字符串或参数列表；python 类型的任务以无缓冲模式运行"""
+        if isinstance(self.cmd, str):
+            args = shlex.split(self.cmd, posix=(os.name != "nt"))
+        else:
+            args = list(self.cmd)
+        if self.task_type == "python":
+            args = [sys.executable, "-u"] + args
+        return args
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "pid": self.pid,
+            "status": self.status,
+            "start_time": self.start_time,
+            "exit_code": self.exit_code,
+            "restart_count": self.restart_count,
+            "restart_policy": self.policy.mode,
+            "failures": self.failures,
+        }
+
 
 class ProcessManager():
-    """管理进程的创建结束，生命周期，捕获输出到队列中"""
-    def __init__(self):
-        self.stdout_queue = Queue()
-        process_dict = {}
-        pass
-    def add_task(self, task_name:str, task_cmd:str,task_type) -> None:
-        pass
+    """
+    管理进程的创建结束，生命周期，捕获输出到队列中
+    所有子进程的 stdout/stderr 都在同一个 asyncio 事件循环线程里读取，
+    不再为每个流各开一个阻塞线程（读取输出只需 1 个线程，而不是 2N 个；
+    Python 3.12 之前 asyncio 默认为每个子进程另开一个 waitpid 线程，3.12 起 Linux 上改用 pidfd，不再需要这些线程）
+
+    消息总线：子进程在 stdout 输出一行 [CMD:TARGET:PAYLOAD] 即可把 PAYLOAD 发给 TARGET，
+    解析和路由都在事件循环线程中完成。TARGET 依次按以下方式解析：
+        *        广播给除发送者以外的所有任务
+        任务名    发给该任务
+        主题名    发给 subscribe() 订阅了该主题的所有任务
+    每个任务有一个有界的 stdin 队列和一个异步写入协程（write + drain），
+    目标队列满时发送方的输出读取会等待（背压），超过 route_timeout 仍未写入则丢弃并发出 message_dropped 事件
+    process_dict 和 routes 只在事件循环线程中修改，路由解析遍历它们时不会与其他线程的增删冲突
+
+    输出按块读取，由每个任务每个流各自的 StreamDecoder 解码；encoding 为 None 时逐个任务自动检测
+    （UTF-8 或系统编码，如中文 Windows 的 GBK），写入 stdin 时使用该任务检测到的编码
+    """
+    CMD_PREFIX = "[CMD:"
+    def __init__(self, encoding:str|None = None, line_limit:int = 1024 * 1024, queue_size:int = 1024,
+                 overflow:str = "drop-oldest", batch_lines:int = 256, batch_window:float = 0.02,
+                 log_capacity:int = 4 * 1024 * 1024, log_max_lines:int = 65536,
+                 stdin_queue_size:int = 1024, route_timeout:float = 1.0):
+        # 输出按批进入有界队列：攒够 batch_lines 行或距本批第一行超过 batch_window 秒即提交
+        self.stdout_queue = BatchQueue(queue_size, overflow)
+        self.batch_lines = batch_lines
+        self.batch_window = batch_window
+        self.log_capacity = log_capacity
+        self.log_max_lines = log_max_lines
+        self.event_queue = Queue()# 结构化的生命周期事件（启动、退出、重启决策、熔断）
+        self.event_listeners = []
+        self.process_dict:dict[str, TaskState] = {}
+        self.routes:dict[str, set[str]] = {}# 主题 -> 订阅的任务名
+        self.macros = MacroEngine(self)# 对输出执行宏规则，由 msg_handle() 启动的线程处理
+        self.stdin_queue_size = stdin_queue_size
+        self.route_timeout = route_timeout
+        self.bus_stats = {"routed": 0, "delivered": 0, "dropped": 0, "unroutable": 0}
+        self.encoding = encoding
+        self.line_limit = line_limit# 单行最大长度（字符），超过后按块输出
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, name="ProcessManagerLoop", daemon=True)
+        self.loop_thread.start()
+
+    def call(self, coro, timeout:float|None = None):
+        """在事件循环线程中执行协程，并在调用线程中等待结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def add_task(self, task_name:str, task_cmd, task_type:str = "cmd", restart_policy:RestartPolicy|None = None) -> None:
+        state = TaskState(task_name, task_cmd, task_type, restart_policy, LogRingBuffer(self.log_capacity, self.log_max_lines), self.stdin_queue_size)
+        self.call(self._add(state))
+
     def remove_task(self, task_name:str) -> None:
-        pass
+        self.call(self._remove(task_name))
+
     def restart_task(self, task_name:str) -> None:
-        pass
-    def read_output(self,stream):
+        """手动重启：同时清空退避和熔断状态"""
+        self.call(self._restart(task_name))
+
+    def request_restart(self, task_name:str, reason:str = "request") -> None:
+        """
+        自动重启（宏规则等）：结束正在运行的进程，由重启策略的退避和熔断决定何时重新启动，不清空失败计数
+        与策略的 mode 无关，请求的重启总会进行（除非已熔断）；可以在任意线程调用，不等待结果
+        """
+        self.loop.call_soon_threadsafe(self._request_restart, task_name, reason)
+
+    def add_event_listener(self, listener) -> None:
+        """listener(event:dict) 在事件循环线程中被调用，不应阻塞"""
+        self.event_listeners.append(listener)
+
+    def emit_event(self, event:str, state:TaskState, **fields) -> None:
+        record = {"event": event, "task": state.name, "time": time.time(), "pid": state.pid, **fields}
+        self.event_queue.put(record)
+        for listener in self.event_listeners:
+            listener(record)
+
+    def subscribe(self, task_name:str, topic:str) -> None:
+        self.loop.call_soon_threadsafe(lambda: self.routes.setdefault(topic, set()).add(task_name))
+
+    def unsubscribe(self, task_name:str, topic:str|None = None) -> None:
+        """取消订阅；topic 为 None 时取消该任务的全部订阅"""
+        def remove():
+            for name in ([topic] if topic is not None else list(self.routes)):
+                subscribers = self.routes.get(name)
+                if subscribers is None:
+                    continue
+                subscribers.discard(task_name)
+                if not subscribers:
+                    del self.routes[name]
+        self.loop.call_soon_threadsafe(remove)
+
+    def send_message(self, target:str, payload:str, source:str|None = None, timeout:float|None = None) -> int:
+        """从任意线程发送消息，返回成功进入队列的目标数"""
+        return self.call(self._route(source, target, payload), timeout)
+
+    def task_log(self, task_name:str) -> LogRingBuffer:
+        return self.process_dict[task_name].log
+
+    def task_info(self, task_name:str) -> dict:
+        return self.process_dict[task_name].info()
+
+    def tasks(self) -> list[dict]:
+        return [state.info() for state in list(self.process_dict.values())]
+
+    def stop_all(self, timeout:float = 5.0) -> None:
+        """同时结束所有任务，共用一个截止时间，超时的任务被 kill；任务保留在列表中，状态为 stopped"""
+        states = list(self.process_dict.values())
+        if states:
+            self.call(self._stop_all(states, timeout))
+
+    def close(self, timeout:float = 5.0) -> None:
+        """结束所有任务并停止事件循环"""
+        self.stop_all(timeout)
+        self.loop.call_soon_threadsafe(self.process_dict.clear)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+
+    def _cancel_writer(self, state:TaskState) -> None:
+        if state.stdin_writer is not None:
+            state.stdin_writer.cancel()
+            state.stdin_writer = None
+
+    async def _add(self, state:TaskState) -> None:
+        current = self.process_dict.get(state.name)
+        if current is not None and current.status in ("running", "backoff"):
+            raise ValueError(f"task {state.name} is already running")
+        self.process_dict[state.name] = state
+        await self._start(state)
+
+    async def _remove(self, task_name:str) -> None:
+        state = self.process_dict.pop(task_name, None)
+        if state is not None:
+            await self._stop(state)
+
+    async def _restart(self, task_name:str) -> None:
+        state = self.process_dict[task_name]
+        await self._stop(state)
+        state.restart_count += 1
+        state.failures = 0
+        state.quick_exits.clear()
+        self.emit_event("restart", state, reason="manual")
+        await self._start(state)
+
+    async def _start(self, state:TaskState) -> None:
+        self._cancel_writer(state)# 旧进程的写入协程不能留到新进程
+        state.exit_code = None
+        state.restart_requested = None
+        state.restart_handle = None
+        state.decoders = {name: StreamDecoder(self.encoding) for name in ("stdout", "stderr")}
+        state.started_at = time.monotonic()
         try:
-            for line in iter(stream.readline, ''):
-                self.stdout_queue.put((line.strip()))
-        finally:
-            stream.close()
-    def msg_handle(self):
-        msg_handle = msg_handler(self.stdout_queue)
-        threading.Thread(target=msg_handle.handle_msg, args=()).start()
+            state.process = await asyncio.create_subprocess_exec(
+                *state.args(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except (OSError, ValueError) as e:
+            # 命令行错误（找不到程序等）也按失败退出处理，交给重启策略
+            state.process = None
+            state.pid = None
+            state.status = "exited"
+            self.emit_event("spawn_failed", state, error=str(e))
+            self._on_exit(state, None)
+            return
+        state.pid = state.process.pid
+        state.start_time = time.time()
+        state.status = "running"
+        self.emit_event("started", state, restart_count=state.restart_count)
+        state.stdin_writer = self.loop.create_task(self._write_stdin(state, state.process))
+        self.loop.create_task(self._watch(state, state.process))
+
+    async def _stop(self, state:TaskState, timeout:float = 2) -> None:
+        if state.restart_handle is not None:
+            state.restart_handle.cancel()
+            state.restart_handle = None
+        self._cancel_writer(state)
+        process = state.process
+        if process is None or process.returncode is not None:
+            state.status = "stopped"
+            return
+        state.status = "stopped"
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), timeout)
+        except ProcessLookupError:
+            pass# 进程在发送信号前已经退出
+        except asyncio.TimeoutError:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass# 恰好在截止时间退出
+        await process.wait()
+
+    async def _stop_all(self, states:list[TaskState], timeout:float) -> None:
+        # 每个 _stop 都先立即发送 terminate 再等待，gather 使所有等待并发进行
+        await asyncio.gather(*(self._stop(state, timeout) for state in states))
+
+    async def _watch(self, state:TaskState, process) -> None:
+        """等待两个输出流读完、进程退出后记录退出码"""
+        await asyncio.gather(
+            self._read_stream(state, process.stdout, "stdout"),
+            self._read_stream(state, process.stderr, "stderr"),
+        )
+        exit_code = await process.wait()
+        if state.process is not process:
+            return
+        self._cancel_writer(state)
+        state.exit_code = exit_code
+        if state.status == "stopped":
+            self.emit_event("stopped", state, exit_code=exit_code)
+            return
+        state.status = "exited"
+        self.emit_event("exited", state, exit_code=exit_code, uptime=round(time.monotonic() - state.started_at, 3))
+        self._on_exit(state, exit_code)
+
+    def _on_exit(self, state:TaskState, exit_code:int|None) -> None:
+        """按重启策略决定是否重启，以及等待多久；request_restart() 要求的退出总是重启，但同样经过熔断和退避"""
+        policy = state.policy
+        requested = state.restart_requested
+        state.restart_requested = None
+        now = time.monotonic()
+        if now - state.started_at >= policy.min_uptime:
+            # 稳定运行过足够长时间，退避从头开始
+            if state.failures:
+                self.emit_event("backoff_reset", state, failures=state.failures)
+            state.failures = 0
+        else:
+            state.quick_exits.append(now)
+        if requested is None and not policy.should_restart(exit_code):
+            self.emit_event("restart_skipped", state, exit_code=exit_code, policy=policy.mode)
+            return
+        self._schedule_restart(state, exit_code)
 
+    def _schedule_restart(self, state:TaskState, exit_code:int|None) -> None:
+        policy = state.policy
+        now = time.monotonic()
+        while state.quick_exits and now - state.quick_exits[0] > policy.crash_window:
+            state.quick_exits.popleft()
+        if len(state.quick_exits) >= policy.crash_limit:
+            state.status = "crash-loop"
+            self.emit_event("crash_loop", state, exit_code=exit_code, quick_exits=len(state.quick_exits), window=policy.crash_window)
+            return
+        state.failures += 1
+        delay = policy.backoff_delay(state.failures)
+        state.status = "backoff"
+        self.emit_event("restart_scheduled", state, exit_code=exit_code, delay=round(delay, 3), attempt=state.failures)
+        state.restart_handle = self.loop.call_later(delay, lambda: self.loop.create_task(self._auto_restart(state)))
 
+    def _request_restart(self, task_name:str, reason:str) -> None:
+        state = self.process_dict.get(task_name)
+        if state is None:
+            return
+        process = state.process
+        if state.status == "running":
+            # 进程可能已经退出、只是 _watch 还没读完输出，这时只记下请求，退出照样由 _watch 交给 _on_exit 处理
+            state.restart_requested = reason
+            self.emit_event("restart_requested", state, reason=reason)
+            if process is not None and process.returncode is None:
+                self.loop.create_task(self._terminate(process))
+        elif state.status == "exited":
+            # 已经退出且策略没有安排重启（退出已由 _on_exit 计入熔断窗口）
+            self.emit_event("restart_requested", state, reason=reason)
+            self._schedule_restart(state, state.exit_code)
+        else:
+            # backoff 中已经安排了重启；crash-loop 熔断后只能手动重启；stopped 是手动停止的
+            self.emit_event("restart_ignored", state, reason=reason, status=state.status)
+
+    async def _terminate(self, process, timeout:float = 2) -> None:
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), timeout)
+        except ProcessLookupError:
+            pass
+        except asyncio.TimeoutError:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+
+    async def _auto_restart(self, state:TaskState) -> None:
+        if state.status != "backoff" or self.process_dict.get(state.name) is not state:
+            return
+        state.restart_count += 1
+        await self._start(state)
+
+    async def _write_stdin(self, state:TaskState, process) -> None:
+        """把 stdin 队列中的消息逐行写入子进程，drain 等待管道有空间，慢的消费者只会让自己的队列变满"""
+        while True:
+            payload = await state.stdin_queue.get()
+            try:
+                process.stdin.write(payload.encode(state.decoders["stdout"].encoding, errors="replace") + b"\n")
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+    def _resolve(self, source:str|None, target:str) -> list[TaskState]:
+        if target == "*":
+            names = [name for name in self.process_dict if name != source]
+        elif target in self.process_dict:
+            names = [target]
+        else:
+            names = self.routes.get(target, ())
+        result = []
+        for name in names:
+            state = self.process_dict.get(name)
+            if state is not None and state.status in ("running", "backoff"):
+                result.append(state)
+        return result
+
+    async def _route(self, source:str|None, target:str, payload:str) -> int:
+        self.bus_stats["routed"] += 1
+        targets = self._resolve(source, target)
+        if not targets:
+            self.bus_stats["unroutable"] += 1
+            return 0
+        delivered = 0
+        for state in targets:
+            try:
+                state.stdin_queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                try:
+                    await asyncio.wait_for(state.stdin_queue.put(payload), self.route_timeout)
+                except asyncio.TimeoutError:
+                    self.bus_stats["dropped"] += 1
+                    self.emit_event("message_dropped", state, source=source, target=target)
+                    continue
+            delivered += 1
+        self.bus_stats["delivered"] += delivered
+        return delivered
+
+    def parse_command(self, line:str) -> tuple[str, str]|None:
+        """解析 [CMD:TARGET:PAYLOAD]，PAYLOAD 中可以包含冒号"""
+        if not (line.startswith(self.CMD_PREFIX) and line.endswith("]")):
+            return None
+        target, sep, payload = line[len(self.CMD_PREFIX):-1].partition(":")
+        if not sep or not target:
+            return None
+        return target, payload
+
+    async def _read_stream(self, state:TaskState, stream, stream_name:str, chunk_size:int = 65536) -> None:
+        decoder = state.decoders[stream_name]
+        batch = []
+        flush_handle = None
+
+        def flush():
+            nonlocal batch, flush_handle
+            if flush_handle is not None:
+                flush_handle.cancel()
+                flush_handle = None
+            if not batch:
+                return None
+            item = (state.name, stream_name, batch)
+            batch = []
+            if self.stdout_queue.try_put(item):
+                return None
+            return item# block 策略下队列已满，由调用方等待后重试
+
+        async def flush_blocking():
+            item = flush()
+            while item is not None and not self.stdout_queue.try_put(item):
+                await asyncio.sleep(0.005)# 不阻塞事件循环，其余子进程的输出照常读取
+
+        def flush_later():
+            # 定时提交时不能等待，队列已满则把这一批放回，等下一次提交
+            nonlocal batch, flush_handle
+            item = flush()
+            if item is not None:
+                batch = item[2] + batch
+                flush_handle = self.loop.call_later(self.batch_window, flush_later)
+
+        while True:
+            data = await stream.read(chunk_size)
+            if not data:
+                lines = decoder.flush(final=True)# 结束时最后一行没有换行符，残缺的字节按 replace 处理
+            else:
+                lines = decoder.feed(data)
+                if len(decoder.partial) > self.line_limit:
+                    lines += decoder.flush()# 未结束的行已超过 line_limit，不再等待换行
+            if any(len(line) > self.line_limit for line in lines):
+                # 超长的行按 line_limit 分块输出；切在解码后的字符之间，不会拆开多字节字符
+                limit = self.line_limit
+                lines = [line[i:i + limit] for line in lines for i in range(0, len(line) or 1, limit)]
+            for line in lines:
+                state.log.append(line)# 日志先落入环形缓冲区，即使队列丢弃批次也不丢日志
+                batch.append(line)
+                if stream_name == "stdout":
+                    command = self.parse_command(line)
+                    if command is not None:
+                        await self._route(state.name, *command)
+                if len(batch) >= self.batch_lines:
+                    await flush_blocking()
+                elif flush_handle is None:
+                    flush_handle = self.loop.call_later(self.batch_window, flush_later)
+            if not data:
+                break
+        await flush_blocking()
+
+    def msg_handle(self):
+        msg_handle = msg_handler(self.stdout_queue, self.macros)
+        threading.Thread(target=msg_handle.handle_msg, args=()).start()
@@ -0,0 +1,27 @@
+import threading
+
+from PySide6.QtCore import QObject, Signal
+
+
+class QueueNotifier(QObject):
+    """
+    跨线程唤醒 GUI：队列由空变为非空时只发出一次 ready 信号，
+    信号以 QueuedConnection 投递到 GUI 线程的事件循环，空闲时不会有任何唤醒
+    消费者在开始取数据前调用 clear()，之后到达的数据会重新触发一次信号
+    """
+    ready = Signal()
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.pending = False
+
+    def notify(self):
+        with self.lock:
+            if self.pending:
+                return
+            self.pending = True
+        self.ready.emit()
+
+    def clear(self):
+        with self.lock:
+            self.pending = False
@@ -0,0 +1,69 @@
+import codecs
+import locale
+import time
+
+
+def fallback_encoding() -> str:
+    """非 UTF-8 输出时使用的编码：系统首选编码，若系统本身就是 UTF-8 则按 GBK 处理（中文 Windows 子进程的常见输出）"""
+    preferred = locale.getpreferredencoding(False)
+    try:
+        if codecs.lookup(preferred).name != "utf-8":
+            return preferred
+    except LookupError:
+        pass
+    return "gbk"
+
+
+class StreamDecoder():
+    """
+    子进程输出流的增量解码器，每个进程的每个流各一个
+    字节可以在任意位置被切开（包括多字节字符的中间），feed() 只返回已经完整的行，
+    未结束的行保存在 partial 中，等下一块数据或 flush()
+    encoding 为 None 时自动检测：先按 UTF-8 严格解码，遇到非法序列后切换到 fallback 编码并保持不变
+    """
+    def __init__(self, encoding:str|None = None, fallback:str|None = None, errors:str = "replace"):
+        self.errors = errors
+        self.fallback = fallback or fallback_encoding()
+        self.detecting = encoding is None
+        self.encoding = "utf-8" if encoding is None else encoding
+        self.decoder = codecs.getincrementaldecoder(self.encoding)("strict" if self.detecting else errors)
+        self.partial = ""
+        self.partial_since = 0.0# 未结束的行开始等待的时间（单调时钟）
+        self.bytes_in = 0
+
+    def decode(self, data:bytes, final:bool = False) -> str:
+        if not self.detecting:
+            return self.decoder.decode(data, final)
+        buffered = self.decoder.getstate()[0]
+        try:
+            return self.decoder.decode(data, final)
+        except UnicodeDecodeError:
+            # 不是 UTF-8：连同解码器中缓存的半个字符一起交给 fallback 重新解码
+            self.detecting = False
+            self.encoding = self.fallback
+            self.decoder = codecs.getincrementaldecoder(self.encoding)(self.errors)
+            return self.decoder.decode(buffered + data, final)
+
+    def feed(self, data:bytes) -> list[str]:
+        self.bytes_in += len(data)
+        text = self.decode(data)
+        if not text:
+            return []
+        if not self.partial:
+            self.partial_since = time.monotonic()
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        if lines and self.partial:
+            self.partial_since = time.monotonic()
+        return [line[:-1] if line.endswith("\r") else line for line in lines]
+
+    def flush(self, final:bool = False) -> list[str]:
+        """
+        把未结束的行作为一行输出（例如不换行的进度输出）
+        final 为 True 表示流已结束，解码器中残缺的字节也按 errors 处理
+        """
+        text = self.partial + (self.decode(b"", final=True) if final else "")
+        self.partial = ""
+        if not text:
+            return []
+        return [text[:-1] if text.endswith("\r") else text]
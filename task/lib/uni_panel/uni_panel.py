@@ -1,6 +1,8 @@
 import subprocess
 import sys
 import os
+from .log_buffer import LogRingBuffer
+from .log_view import LogView
 from PySide6.QtWidgets import (
     QApplication, QWidget, QLabel, QHBoxLayout, QMenu,
     QSystemTrayIcon, QStyle, QPushButton, QListWidget, QListWidgetItem, QVBoxLayout, QStackedWidget, QLineEdit, QLayout, QFormLayout, QPlainTextEdit
@@ -15,6 +17,8 @@ class base_execcute(QWidget):
     def __init__(self, name:str, content:str):
         super().__init__()
         self.name = name
+        self.log = LogRingBuffer()
+        self.log.append("default output")
         self.interface = self.create_interface(content)
         self.setLayout(self.interface)
 
@@ -24,8 +28,7 @@ class base_execcute(QWidget):
         form_layout = QFormLayout()
         form_layout.addRow(discription_key, discription_val)
         form_layout.setFormAlignment(Qt.AlignCenter)
-        cli_wid = QPlainTextEdit("default output")
-        cli_wid.setReadOnly(True)
+        cli_wid = LogView(self.log)
         bottom = QPushButton(content)
         layout = QVBoxLayout()
         layout.addLayout(form_layout)
@@ -2,20 +2,52 @@ import sys
 import subprocess
 import threading
 import queue
-from PySide6.QtWidgets import QApplication, QMainWindow, QTextEdit, QVBoxLayout, QWidget, QPushButton
-from PySide6.QtCore import QTimer
-
-# 1. 共享队列，用于线程间通信
-message_queue = queue.Queue()
-
-def stream_reader(process_id, stream):
-    """线程执行的函数，负责读取一个流并放入队列"""
+from PySide6.QtWidgets import QApplication, QComboBox, QMainWindow, QVBoxLayout, QWidget, QPushButton
+from PySide6.QtCore import Qt
+
+from task.lib.uni_panel.log_buffer import LogRingBuffer
+from task.lib.uni_panel.log_view import LogView
+from task.lib.uni_panel.process_manager import BatchQueue
+from task.lib.uni_panel.stream_decoder import StreamDecoder
+from task.lib.proc_utils import terminate_all
+from task.lib.uni_panel.queue_notifier import QueueNotifier
+
+# 1. 有界的批量队列，用于线程间通信：队列由空变为非空时唤醒 GUI，输出过多时丢弃最旧的批次并计数
+message_notifier = QueueNotifier()
+message_queue = BatchQueue(maxsize=1024, overflow="drop-oldest", on_ready=message_notifier.notify)
+
+def stream_reader(process_id, stream_name, stream, chunk_size=65536):
+    """
+    线程执行的函数，负责读取一个流并按批放入队列
+    每次读取管道中已有的全部数据（最多 chunk_size 字节），其中完整的行作为一批写入，
+    输出密集时一批有很多行，零星输出时一行就是一批，不增加延迟
+    """
+    decoder = StreamDecoder("utf-8", errors="ignore")
     try:
-        for line in iter(stream.readline, ''):
-            message_queue.put((process_id, line.strip()))
+        while True:
+            data = stream.read1(chunk_size)
+            lines = decoder.feed(data) if data else decoder.flush(final=True)
+            if lines:
+                message_queue.put((process_id, stream_name, [line.strip() for line in lines]))
+            if not data:
+                break
     finally:
         stream.close()
 
+def stdin_writer(process, inbox):
+    """线程执行的函数，负责把转发给该进程的消息写入 stdin，慢的进程不会阻塞界面"""
+    while True:
+        message = inbox.get()
+        if message is None:
+            break
+        try:
+            # 必须加换行符，让对方的 readline() 能读到
+            process.stdin.write((message + '\n').encode('utf-8'))
+            process.stdin.flush()
+        except Exception as e:
+            print(f"Error writing to process: {e}")
+            break
+
 class ProcessManager:
     def __init__(self):
         self.processes = {}  # { 'id': {'process': Popen_object, 'threads': []} }
@@ -32,25 +64,28 @@ class ProcessManager:
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             stdin=subprocess.PIPE,
-            encoding='utf-8',
-            errors='ignore',
-            bufsize=1, # 行缓冲
             # creationflags=subprocess.CREATE_NEW_PROCESS_GROUP # Windows
         )
 
         # 为 stdout 和 stderr 创建监听线程
-        stdout_thread = threading.Thread(target=stream_reader, args=(process_id, process.stdout), daemon=True)
-        stderr_thread = threading.Thread(target=stream_reader, args=(f"{process_id}_ERR", process.stderr), daemon=True)
+        stdout_thread = threading.Thread(target=stream_reader, args=(process_id, "stdout", process.stdout), daemon=True)
+        stderr_thread = threading.Thread(target=stream_reader, args=(process_id, "stderr", process.stderr), daemon=True)
+
+        # stdin 由单独的线程写入，队列有界，满了就丢弃并提示
+        inbox = queue.Queue(maxsize=1024)
+        writer_thread = threading.Thread(target=stdin_writer, args=(process, inbox), daemon=True)
 
         stdout_thread.start()
         stderr_thread.start()
+        writer_thread.start()
 
-        self.processes[process_id] = {'process': process, 'threads': [stdout_thread, stderr_thread]}
+        self.processes[process_id] = {'process': process, 'threads': [stdout_thread, stderr_thread, writer_thread], 'inbox': inbox}
 
     def stop_process(self, process_id):
         if process_id in self.processes:
             print(f"Stopping process {process_id}...")
             p_info = self.processes.pop(process_id)
+            p_info['inbox'].put(None)
             p_info['process'].terminate()  # 发送 SIGTERM
             try:
                 p_info['process'].wait(timeout=2) # 等待2秒
@@ -60,18 +95,22 @@ class ProcessManager:
     
     def send_message_to_process(self, target_id, message):
         if target_id in self.processes:
-            process = self.processes[target_id]['process']
-            if process.poll() is None: # 进程仍在运行
+            p_info = self.processes[target_id]
+            if p_info['process'].poll() is None: # 进程仍在运行
                 try:
-                    # 必须加换行符，让对方的 readline() 能读到
-                    process.stdin.write(message + '\n')
-                    process.stdin.flush()
-                except Exception as e:
-                    print(f"Error writing to {target_id}: {e}")
+                    p_info['inbox'].put_nowait(message)
+                except queue.Full:
+                    print(f"Inbox of {target_id} is full, message dropped.")
     
-    def stop_all(self):
+    def stop_all(self, timeout=2):
+        """同时结束所有进程，共用一个截止时间，而不是逐个等待"""
+        processes = []
         for process_id in list(self.processes.keys()):
-            self.stop_process(process_id)
+            p_info = self.processes.pop(process_id)
+            p_info['inbox'].put(None)
+            processes.append(p_info['process'])
+        result = terminate_all(processes, timeout)
+        print(f"Stopped {result['stopped']} processes in {result['elapsed']}s ({result['killed']} killed).")
 
 class ControlPanel(QMainWindow):
     def __init__(self, manager):
@@ -79,8 +118,13 @@ class ControlPanel(QMainWindow):
         self.manager = manager
         self.setWindowTitle("Process Control Panel (Native Python)")
 
-        self.log_display = QTextEdit()
-        self.log_display.setReadOnly(True)
+        # 每个进程一个环形缓冲区，是该进程日志的唯一存储；视图直接绘制选中进程的缓冲区，只绘制可见的行
+        # "面板" 只记录面板自身的提示（丢弃计数等）
+        self.logs = {"面板": LogRingBuffer(256 * 1024, 4096)}
+        self.log_selector = QComboBox()
+        self.log_selector.addItem("面板")
+        self.log_display = LogView(self.logs["面板"])
+        self.log_selector.currentTextChanged.connect(self.show_log)
         
         self.start_a_button = QPushButton("Start Process A")
         self.start_b_button = QPushButton("Start Process B")
@@ -88,6 +132,7 @@ class ControlPanel(QMainWindow):
         self.stop_b_button = QPushButton("Stop Process B")
 
         layout = QVBoxLayout()
+        layout.addWidget(self.log_selector)
         layout.addWidget(self.log_display)
         layout.addWidget(self.start_a_button)
         layout.addWidget(self.start_b_button)
@@ -104,33 +149,68 @@ class ControlPanel(QMainWindow):
         self.stop_a_button.clicked.connect(lambda: self.manager.stop_process('ProcA'))
         self.stop_b_button.clicked.connect(lambda: self.manager.stop_process('ProcB'))
 
-        # 2. 设置定时器，定期从队列中读取消息
-        self.timer = QTimer(self)
-        self.timer.setInterval(100)  # 每100毫秒
-        self.timer.timeout.connect(self.process_queue)
-        self.timer.start()
+        # 2. 有消息到达时才唤醒 GUI 线程，每轮最多处理 drain_batch 行，剩余的留给下一轮事件循环
+        self.drain_batch = 500
+        self.dropped_lines = 0
+        message_notifier.ready.connect(self.process_queue, Qt.ConnectionType.QueuedConnection)
+
+    def task_log(self, process_id):
+        """取进程的日志缓冲区，第一次出现的进程会加入选择框；当前显示的是面板提示时切换到该进程"""
+        log = self.logs.get(process_id)
+        if log is None:
+            log = self.logs[process_id] = LogRingBuffer(1024 * 1024, 16384)
+            self.log_selector.addItem(process_id)
+            if self.log_selector.currentText() == "面板":
+                self.log_selector.setCurrentText(process_id)
+        return log
+
+    def append_lines(self, process_id, lines):
+        self.task_log(process_id).extend(lines)
+        if self.log_display.log is self.logs[process_id]:
+            self.log_display.notify_appended()
+
+    def show_log(self, name):
+        if name in self.logs:
+            self.log_display.set_buffer(self.logs[name])
 
     def process_queue(self):
-        """处理消息队列中的所有消息"""
-        while not message_queue.empty():
+        """处理消息队列中的批次，一轮最多 drain_batch 行（至少一批），避免大量输出时界面无响应"""
+        message_notifier.clear()
+        handled = 0
+        while handled < self.drain_batch:
             try:
-                source_id, message = message_queue.get_nowait()
-                self.log_display.append(f"[{source_id}]: {message}")
-                
-                # 在这里处理和转发消息
-                self.parse_and_forward(source_id, message)
+                process_id, stream_name, lines = message_queue.get_nowait()
             except queue.Empty:
-                break # 队列空了，退出循环
+                break # 队列空了，等待下一次通知
+            prefix = "" if stream_name == "stdout" else "[ERR] "
+            output = []
+            for message in lines:
+                output.append(prefix + message)
+
+                # 在这里处理和转发消息，转发提示紧跟在命令之后
+                notice = self.parse_and_forward(process_id, message)
+                if notice is not None:
+                    output.append(notice)
+            self.append_lines(process_id, output)
+            handled += len(lines)
+        stats = message_queue.stats()
+        if stats["dropped_lines"] > self.dropped_lines:
+            self.append_lines("面板", [f"--- 输出过多，已丢弃 {stats['dropped_lines'] - self.dropped_lines} 行（累计 {stats['dropped_lines']} 行，队列 {stats['depth']} 批，平均每批 {stats['avg_batch_size']:.1f} 行）---"])
+            self.dropped_lines = stats["dropped_lines"]
+        if not message_queue.empty():
+            # 还有剩余，重新排队一次，让输入和绘制事件先得到处理
+            message_notifier.notify()
     
     def parse_and_forward(self, source_id, message):
-        """解析消息并转发"""
+        """解析消息并转发，返回写入日志的转发提示，不是转发命令时返回 None"""
         # 假设协议是 [CMD:TARGET_ID:PAYLOAD]
         if message.startswith('[CMD:') and ']' in message:
-            parts = message[5:-1].split(':', 2)
+            parts = message[5:-1].split(':', 1) # PAYLOAD 中可以包含冒号
             if len(parts) == 2:
                 target_id, payload = parts
-                self.log_display.append(f"--- FORWARDING from {source_id} to {target_id}: {payload} ---")
                 self.manager.send_message_to_process(target_id, payload)
+                return f"--- FORWARDING from {source_id} to {target_id}: {payload} ---"
+        return None
 
     def closeEvent(self, event):
         """关闭窗口时清理所有子进程"""
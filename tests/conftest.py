@@ -0,0 +1,29 @@
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("QT_LOGGING_RULES", "default.warning=false")# offscreen 平台每次弹出菜单都会警告不支持抓取键盘
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PySide6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication(sys.argv)
+
+
+@pytest.fixture
+def no_stdin(monkeypatch):
+    """不启动护眼窗口读取 stdin 的 IPC 监听线程，测试结束时不会残留运行中的 QThread"""
+    monkeypatch.setattr(sys, "stdin", None)
+
+
+def wait_for(condition, timeout:float = 20.0, interval:float = 0.02) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(interval)
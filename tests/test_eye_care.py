@@ -0,0 +1,119 @@
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import pytest
+from PySide6.QtCore import QObject, QTimer
+
+from task.lib.eye_care import eye_care
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    return now
+
+
+def test_countdown_long_run_pause_and_suspend(clock):
+    """模拟时钟下 8 小时、唤醒间隔随机抖动：剩余时间只由截止时间现算，不累积误差；暂停期间不计时；休眠后截止时间已过"""
+    countdown = eye_care.PhaseCountdown(lambda: clock[0])
+    countdown.start(8 * 3600)
+    elapsed = 0.0
+    while elapsed < 8 * 3600 - 2:
+        step = random.uniform(0.9, 1.3)
+        clock[0] += step
+        elapsed += step
+    assert abs(countdown.remaining() - (8 * 3600 - elapsed)) < 1e-6
+    countdown.start(600)
+    countdown.pause()
+    clock[0] += 3600
+    countdown.resume()
+    assert countdown.remaining() == 600
+    clock[0] += 7200
+    assert countdown.remaining() == 0.0
+
+
+def test_widget_transitions(qapp, no_stdin, clock):
+    """按 max_timer_sleep 的上限逐次唤醒，恰好在截止时间切换到休息；休息中系统休眠 1 小时，唤醒后只切换一次；隐藏时不刷新标签"""
+    widget = eye_care.EyeCareTimerWidget({"work_minutes": 25, "rest_minutes": 5})
+    try:
+        widget.countdown = eye_care.PhaseCountdown(lambda: clock[0])
+        widget.start_countdown(25 * 60)
+        wakeups = 0
+        while widget.state == "work":
+            clock[0] += widget.transition_timer.interval() / 1000
+            widget.on_transition_timeout()
+            wakeups += 1
+        assert wakeups == 25 * 60 // widget.config["max_timer_sleep"]
+        clock[0] += 3600
+        widget.on_transition_timeout()
+        assert widget.state == "work" and abs(widget.time_left - 25 * 60) < 1e-6
+        widget.hide()
+        assert not widget.label_timer.isActive()
+        widget.show()
+        assert widget.label_timer.isActive()
+    finally:
+        widget.rest_overlay.close()
+
+
+def test_widget_real_clock_switch(qapp, no_stdin):
+    """真实事件循环中 3 秒的工作阶段在截止时间附近切换到休息"""
+    widget = eye_care.EyeCareTimerWidget({})
+    try:
+        switched = []
+        start_rest = widget.start_rest
+        widget.start_rest = lambda: (switched.append(time.monotonic()), start_rest(), qapp.quit())
+        expected = time.monotonic() + 3
+        widget.start_countdown(3)
+        QTimer.singleShot(6000, qapp.quit)
+        qapp.exec()
+        assert switched, "work phase did not end"
+        assert abs(switched[0] - expected) < 0.5
+    finally:
+        widget.rest_overlay.close()
+
+
+def test_ipc_replies_and_stdout(qapp, no_stdin):
+    """创建窗口不改动全局的 sys.stdout；处理函数抛出任意异常时也回复 internal_error，父进程不会一直等待"""
+    stdout = sys.stdout
+    widget = eye_care.EyeCareTimerWidget({})
+    try:
+        assert sys.stdout is stdout
+        replies = []
+        widget.ipc_writer.send = replies.append
+        widget.ipc_methods = lambda: {"boom": lambda params: 1 / 0, "bad": lambda params: int(params["n"])}
+        widget.handle_command(json.dumps({"id": 1, "method": "boom"}))
+        widget.handle_command(json.dumps({"id": 2, "method": "bad", "params": {}}))
+        assert [(reply["id"], reply["error"]["code"]) for reply in replies] == [(1, "internal_error"), (2, "invalid_params")]
+    finally:
+        widget.rest_overlay.close()
+
+
+def test_menu_reopen_does_not_grow(qapp, no_stdin, count=10000):
+    """右键菜单打开 10000 次（每次同步勾选状态后弹出再关闭），QObject 数量不变，Python 分配不随次数增长"""
+    widget = eye_care.EyeCareTimerWidget({})
+    try:
+        widget.show()
+        def open_menu():
+            widget.refresh_menu()
+            widget.menu.popup(widget.pos())
+            qapp.processEvents()
+            widget.menu.hide()
+        for _ in range(200):# 预热：样式、字体等缓存先填满
+            open_menu()
+        gc.collect()
+        children = len(widget.findChildren(QObject))
+        tracemalloc.start()
+        snapshot = tracemalloc.take_snapshot()
+        for _ in range(count):
+            open_menu()
+        gc.collect()
+        growth = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, "filename"))
+        tracemalloc.stop()
+        assert len(widget.findChildren(QObject)) == children
+        assert growth < 256 * 1024, growth
+    finally:
+        widget.rest_overlay.close()
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event
+
+import pytest
+
+from task.lib.gost_subscribe import AtomicConfigFile, GostReconciler, gost_subscribe
+
+
+@pytest.fixture
+def reconciler(tmp_path):
+    """替身 gost 只会 sleep，第一个参数（gost 程序路径）被替换为替身脚本；/nonexistent/ 下的程序照原样启动（失败）"""
+    stub = tmp_path / "gost_stub.py"
+    stub.write_text("import time\ntime.sleep(600)\n")
+    def spawn(args):
+        if args[0].startswith("/nonexistent/"):
+            return subprocess.Popen(args)# 真实的启动失败（FileNotFoundError）
+        return subprocess.Popen([sys.executable, str(stub)] + args[1:])
+    reconciler = GostReconciler(spawn=spawn, stop_timeout=2)
+    yield reconciler
+    reconciler.stop_all()
+
+
+def test_reconcile_keeps_unchanged_tunnels(reconciler):
+    """配置变化时只有变化的隧道被重启，未变化的隧道 PID 不变；意外退出的隧道在下一次 reconcile 时被重新拉起"""
+    old_cfg = [
+        "data\\gost.exe -L 127.0.0.1:1111 -F relay+mtls://u:p@10.0.0.1:1001\n",
+        "data\\gost.exe -L 127.0.0.1:1112 -F relay+mtls://u:p@10.0.0.2:1002\n",
+        "data\\gost.exe -L 127.0.0.1:1113 -F relay+mtls://u:p@10.0.0.3:1003\n",
+        "\n",
+    ]
+    new_cfg = [
+        "data\\gost.exe -L 127.0.0.1:1111 -F relay+mtls://u:p@10.0.0.1:1001  \n",# 只有空白变化
+        "data\\gost.exe -L 127.0.0.1:1112 -F relay+mtls://u:p@10.9.9.9:2002\n",# 上游变化
+        "data\\gost.exe -L 127.0.0.1:1114 -F relay+mtls://u:p@10.0.0.4:1004\n",# 新增，1113 删除
+    ]
+    result = reconciler.reconcile(GostReconciler.parse(old_cfg))
+    assert sorted(result["started"]) == ["127.0.0.1:1111", "127.0.0.1:1112", "127.0.0.1:1113"]
+    pids = {key: process.pid for key, (args, process) in reconciler.running.items()}
+    result = reconciler.reconcile(GostReconciler.parse(new_cfg))
+    assert result == {"started": ["127.0.0.1:1114"], "replaced": ["127.0.0.1:1112"], "stopped": ["127.0.0.1:1113"], "unchanged": ["127.0.0.1:1111"], "failed": []}
+    assert reconciler.running["127.0.0.1:1111"][1].pid == pids["127.0.0.1:1111"]
+    assert reconciler.running["127.0.0.1:1112"][1].pid != pids["127.0.0.1:1112"]
+    reconciler.running["127.0.0.1:1114"][1].kill()
+    reconciler.running["127.0.0.1:1114"][1].wait()
+    result = reconciler.reconcile(GostReconciler.parse(new_cfg))
+    assert result["replaced"] == ["127.0.0.1:1114"] and len(result["unchanged"]) == 2
+
+
+def test_reconcile_spawn_failure(reconciler):
+    """一条隧道启动失败时记入 failed 和 errors，其余隧道照常启动；修正后下一次 reconcile 启动它"""
+    cfg = [
+        "data\\gost.exe -L 127.0.0.1:1111 -F relay+mtls://u:p@10.0.0.1:1001\n",
+        "/nonexistent/gost -L 127.0.0.1:1112 -F relay+mtls://u:p@10.0.0.2:1002\n",
+        "data\\gost.exe -L 127.0.0.1:1113 -F relay+mtls://u:p@10.0.0.3:1003\n",
+    ]
+    result = reconciler.reconcile(GostReconciler.parse(cfg))
+    assert result["started"] == ["127.0.0.1:1111", "127.0.0.1:1113"] and result["failed"] == ["127.0.0.1:1112"]
+    assert "FileNotFoundError" in reconciler.errors["127.0.0.1:1112"] and "127.0.0.1:1112" not in reconciler.running
+    cfg[1] = "data\\gost.exe -L 127.0.0.1:1112 -F relay+mtls://u:p@10.0.0.2:1002\n"
+    result = reconciler.reconcile(GostReconciler.parse(cfg))
+    assert result["started"] == ["127.0.0.1:1112"] and result["failed"] == [] and reconciler.errors == {}
+    assert len(result["unchanged"]) == 2
+
+
+@pytest.mark.parametrize("name", ["fsync", "replace"])
+@pytest.mark.parametrize("crash_at", range(1, 5))
+def test_atomic_write_crash(tmp_path, monkeypatch, name, crash_at):
+    """
+    在 AtomicConfigFile.write 的第 crash_at 次 fsync / os.replace 注入崩溃，目标文件始终是完整的旧内容或新内容，不留下临时文件；
+    之后可以正常写入，rollback() 恢复旧内容
+    """
+    path = str(tmp_path / "gost_info")
+    old, new = b"old config\n" * 1000, b"new config\n" * 1000
+    with open(path, "wb") as f:
+        f.write(old)
+    real = getattr(os, name)
+    calls = [0]
+    def crashing(*args):
+        calls[0] += 1
+        if calls[0] == crash_at:
+            raise OSError(f"injected crash in {name} #{crash_at}")
+        return real(*args)
+    monkeypatch.setattr(os, name, crashing)
+    try:
+        AtomicConfigFile(path).write(new)
+        crashed = False
+    except OSError:
+        crashed = True
+    monkeypatch.setattr(os, name, real)
+    with open(path, "rb") as f:
+        content = f.read()
+    assert content in (old, new)
+    assert crashed or content == new
+    assert not os.path.exists(path + ".tmp") and not os.path.exists(path + ".bak.tmp")
+    AtomicConfigFile(path).write(new)
+    with open(path, "rb") as f:
+        assert f.read() == new
+    assert AtomicConfigFile(path).rollback()
+    with open(path, "rb") as f:
+        assert f.read() == old
+
+
+def test_atomic_write_skips_unchanged(tmp_path):
+    path = str(tmp_path / "gost_info")
+    assert AtomicConfigFile(path).rollback() is False
+    assert AtomicConfigFile(path).write(b"a\n") is True
+    mtime = os.stat(path).st_mtime_ns
+    assert AtomicConfigFile(path).write(b"a\n") is False and os.stat(path).st_mtime_ns == mtime
+
+
+@pytest.mark.parametrize("bad", ["# 空配置\n", "/nonexistent/gost -L 127.0.0.1:1111 -F relay+mtls://u:p@10.0.0.1:1001\n"])
+def test_apply_gost_info_rolls_back(reconciler, tmp_path, bad):
+    """新的 gost_info 解析不出隧道或全部启动失败时，恢复 .bak 中的上一个版本并按它启动隧道；没有备份时保持原样"""
+    path = tmp_path / "gost_info"
+    good = "data\\gost.exe -L 127.0.0.1:1111 -F relay+mtls://u:p@10.0.0.1:1001\n"
+    manager = gost_subscribe(endpoints=[{"name": "gost", "url": "http://127.0.0.1:1/", "path": str(path)}])
+    messages = []
+    manager.msg_out = messages.append
+    AtomicConfigFile(str(path)).write(bad.encode())
+    manager.apply_gost_info(reconciler)
+    assert not reconciler.running and "没有可恢复的备份" in messages[-1]
+    AtomicConfigFile(str(path)).write(good.encode())
+    AtomicConfigFile(str(path)).write(bad.encode())
+    result = manager.apply_gost_info(reconciler)
+    assert path.read_text() == good and "已恢复上一个版本" in messages[-1]
+    assert result["started"] == ["127.0.0.1:1111"] and result["failed"] == []
+
+
+def test_endpoints(tmp_path):
+    """没有订阅地址时一轮检查直接结束；缺少必填项时报错；gost 的配置从其订阅地址的 path 读取"""
+    manager = gost_subscribe(endpoints=[])
+    manager.msg_out = lambda message: None
+    manager.renew_cfg(Event(), [""])
+    assert asyncio.run(manager.fetch_all({})) == {}
+    with pytest.raises(ValueError, match="url"):
+        gost_subscribe(endpoints=[{"name": "gost", "path": "gost_info"}])
+    path = tmp_path / "gost_info"
+    path.write_text("gost -L :1080\n")
+    manager = gost_subscribe(endpoints=[{"name": "gost", "url": "http://127.0.0.1:1/", "path": str(path)}])
+    assert manager.gost_info_path == str(path) and manager.config_init() == ["gost -L :1080\n"]
+
+
+def test_conditional_fetch(tmp_path, cycles=3):
+    """
+    用本地 HTTP 服务校验订阅的条件请求：分别以 ETag、Last-Modified、无校验头三种方式提供同一份加密内容，
+    内容不变时不解密、不写盘（304 不下载正文，无校验头时按摘要跳过），内容变化后重新写入，所有请求复用连接
+    """
+    content = {"body": b"", "mtime": time.time()}
+    connections, responses = set(), []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def log_message(self, *args):
+            pass
+        def do_GET(self):
+            connections.add(self.client_address)
+            body = content["body"]
+            etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+            modified = formatdate(content["mtime"], usegmt=True)
+            headers = {"ETag": etag} if self.path == "/etag" else {"Last-Modified": modified} if self.path == "/modified" else {}
+            if (self.path == "/etag" and self.headers.get("If-None-Match") == etag) or \
+               (self.path == "/modified" and self.headers.get("If-Modified-Since") == modified):
+                status, body = 304, b""
+            else:
+                status = 200
+            responses.append((self.path, status))
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    names = ("etag", "modified", "plain")
+    base = f"http://127.0.0.1:{server.server_port}"
+    manager = gost_subscribe(endpoints=[
+        {"name": name, "url": f"{base}/{name}", "path": str(tmp_path / name), "encoding": "utf-8"} for name in names
+    ])
+    manager.msg_out = lambda message: None
+    content["body"] = manager.hard_encrypt("proxies:\n" + "- name: node\n" * 20000, manager.key).encode()
+    decrypts = [0]
+    decrypt_bytes = manager.cipher.decrypt_bytes
+    def counting_decrypt(data):
+        decrypts[0] += 1
+        return decrypt_bytes(data)
+    manager.cipher.decrypt_bytes = counting_decrypt
+
+    def poll():
+        responses.clear()
+        decrypts[0] = 0
+        mtimes = {name: os.stat(tmp_path / name).st_mtime_ns for name in names if (tmp_path / name).exists()}
+        manager.renew_cfg(Event(), [""])
+        writes = sum(os.stat(tmp_path / name).st_mtime_ns != mtimes.get(name) for name in names)
+        return decrypts[0], writes
+
+    try:
+        assert poll() == (3, 3)
+        for _ in range(cycles - 1):
+            assert poll() == (0, 0)
+            assert sorted(responses) == [("/etag", 304), ("/modified", 304), ("/plain", 200)]
+        content["body"] = manager.hard_encrypt("proxies:\n- name: changed\n", manager.key).encode()
+        content["mtime"] += 60
+        assert poll() == (3, 3)
+        assert len(connections) < (cycles + 1) * len(names)# 连接被复用，而不是每个请求一条
+    finally:
+        server.shutdown()
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from task.lib.uni_panel.process_manager import ProcessManager, RestartPolicy
+
+from .conftest import ROOT, wait_for
+
+
+@pytest.fixture
+def manager():
+    manager = ProcessManager()
+    events = []
+    manager.add_event_listener(events.append)
+    manager.events = events
+    manager.msg_handle()
+    yield manager
+    manager.stdout_queue.put("9527")# 结束 msg_handle 的线程
+    manager.close()
+
+
+def event_names(manager, task_name:str) -> list[str]:
+    return [event["event"] for event in list(manager.events) if event["task"] == task_name]
+
+
+def test_set_var_extracts_named_groups(manager):
+    """dummy.py 输出的 name=... 等行被提取为该任务的变量"""
+    manager.macros.add_rule("vars", r"^(?P<key>name|country|website)=(?P<value>\S+)$", "set_var")
+    manager.macros.add_rule("name", r"^name=(?P<name>\S+)$", "set_var")
+    manager.add_task("dummy", [os.path.join(ROOT, "dummy.py")], "python")
+    wait_for(lambda: manager.macros.get_var("dummy", "value") == "www.mfitzp.com")
+    assert manager.macros.get_var("dummy", "name") == "Martin"
+    assert manager.macros.rules[0].hits == 3
+
+
+def test_restart_rule_restarts_running_task(manager):
+    """匹配的输出行使仍在运行的任务重启：结束进程后按退避重新启动，退出被计入熔断窗口，达到 crash_limit 后熔断"""
+    manager.macros.add_rule("refused", "connection refused", "restart")
+    child = "import time\nprint('dial tcp 10.0.0.1:443: connection refused', flush=True)\ntime.sleep(30)\n"
+    manager.add_task("gost", ["-c", child], "python", RestartPolicy("on-failure", backoff_base=0.05, crash_limit=3, min_uptime=5.0))
+    wait_for(lambda: manager.task_info("gost")["status"] == "crash-loop")
+    names = event_names(manager, "gost")
+    assert names.count("started") == 3 and names.count("restart_requested") == 3
+    assert manager.task_info("gost")["restart_count"] == 2
+    assert [event["attempt"] for event in manager.events if event["task"] == "gost" and event["event"] == "restart_scheduled"] == [1, 2]
+
+
+def test_restart_rule_respects_breaker_after_exit(manager):
+    """输出错误后立即正常退出：on-failure 策略本身不重启，宏规则的重启仍然经过退避和熔断，不会形成无间隔的重启循环"""
+    manager.macros.add_rule("refused", "connection refused", "restart")
+    child = "print('dial tcp 10.0.0.1:443: connection refused', flush=True)\n"
+    manager.add_task("gost", ["-c", child], "python", RestartPolicy("on-failure", backoff_base=0.05, crash_limit=3, min_uptime=5.0))
+    wait_for(lambda: manager.task_info("gost")["status"] == "crash-loop")
+    assert manager.task_info("gost")["restart_count"] == 2
+    assert manager.task_info("gost")["failures"] == 2
@@ -0,0 +1,129 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from task.lib.proc_utils import terminate_all
+from task.lib.uni_panel.process_manager import ProcessManager, RestartPolicy
+
+from .conftest import ROOT, wait_for
+
+SLOW_CHILD = "import signal, sys, time\nsignal.signal(signal.SIGTERM, lambda *a: (time.sleep({delay}), sys.exit(0)))\nprint('ready', flush=True)\ntime.sleep(60)\n"
+STUBBORN_CHILD = "import signal, time\nsignal.signal(signal.SIGTERM, signal.SIG_IGN)\nprint('ready', flush=True)\ntime.sleep(60)\n"
+
+
+def slow_script(i:int) -> str:
+    """收到 SIGTERM 后仍要过 0.5~1.5 秒才退出，每 5 个中有一个完全忽略 SIGTERM"""
+    return STUBBORN_CHILD if i % 5 == 0 else SLOW_CHILD.format(delay=0.5 + i % 3 * 0.5)
+
+
+@pytest.fixture
+def manager():
+    manager = ProcessManager()
+    events = []
+    manager.add_event_listener(events.append)
+    manager.events = events
+    yield manager
+    manager.close()
+
+
+def event_names(manager, task_name:str) -> list[str]:
+    return [event["event"] for event in list(manager.events) if event["task"] == task_name]
+
+
+def test_backoff_and_modes():
+    policy = RestartPolicy("on-failure", backoff_base=1.0, backoff_max=8.0, jitter=0.2)
+    for failures, expected in ((1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (10, 8.0)):
+        assert all(expected * 0.8 <= policy.backoff_delay(failures) <= expected * 1.2 for _ in range(100))
+    assert [RestartPolicy(mode).should_restart(code) for mode in RestartPolicy.MODES for code in (0, 3, None)] == \
+        [False, False, False, False, True, True, True, True, True]
+
+
+def test_crash_loop_and_manual_reset(manager):
+    """立即以非 0 退出的任务按递增的退避重启，达到 crash_limit 后熔断；手动重启清空熔断计数，重新开始退避"""
+    manager.add_task("failing", ["-c", "import sys; sys.exit(3)"], "python",
+                     RestartPolicy("on-failure", backoff_base=0.05, crash_limit=4, min_uptime=1.0))
+    wait_for(lambda: manager.task_info("failing")["status"] == "crash-loop")
+    delays = [event["delay"] for event in manager.events if event["task"] == "failing" and event["event"] == "restart_scheduled"]
+    assert len(delays) == 3 and delays[0] < delays[1] < delays[2]
+    assert manager.task_info("failing")["restart_count"] == 3
+    manager.restart_task("failing")
+    wait_for(lambda: event_names(manager, "failing").count("crash_loop") == 2)
+    assert manager.task_info("failing")["restart_count"] == 7
+
+
+def test_clean_exit_not_restarted(manager):
+    """dummy.py 正常退出，on-failure 策略下不重启"""
+    manager.add_task("dummy", [os.path.join(ROOT, "dummy.py")], "python", RestartPolicy("on-failure", backoff_base=0.05))
+    wait_for(lambda: "restart_skipped" in event_names(manager, "dummy"))
+    assert manager.task_info("dummy")["status"] == "exited" and manager.task_info("dummy")["exit_code"] == 0
+
+
+def test_detects_encoding_per_task():
+    """GBK 输出的任务被检测为 GBK，同时运行的 UTF-8 任务不受影响；超过 line_limit 的长行按块输出，不拆开多字节字符"""
+    manager = ProcessManager(line_limit=1000)
+    try:
+        child = "import sys\nsys.stdout.buffer.write(('连接成功\\n' + '中' * 2500 + '\\n').encode({encoding!r}))\n"
+        for encoding in ("gbk", "utf-8"):
+            manager.add_task(encoding, ["-c", child.format(encoding=encoding)], "python")
+        wait_for(lambda: all(manager.task_info(name)["status"] == "exited" for name in ("gbk", "utf-8")))
+        for encoding in ("gbk", "utf-8"):
+            log = manager.task_log(encoding)
+            lines = log.tail(len(log))
+            assert lines[0] == "连接成功" and "".join(lines[1:]) == "中" * 2500
+            assert len(lines) > 2 and all(len(line) <= 1000 for line in lines)
+            assert manager.process_dict[encoding].decoders["stdout"].encoding == encoding
+    finally:
+        manager.close()
+
+
+def test_spawn_failure_counts_as_crash(manager):
+    manager.add_task("missing", "/nonexistent/gost -L :1080", restart_policy=RestartPolicy("always", backoff_base=0.05, crash_limit=3))
+    wait_for(lambda: "crash_loop" in event_names(manager, "missing"))
+    assert event_names(manager, "missing").count("spawn_failed") == 3
+
+
+def test_uptime_resets_backoff(manager):
+    """每次运行 0.3 秒，超过 min_uptime：退避次数每次清零，不会熔断"""
+    manager.add_task("flapping", ["-c", "import time; time.sleep(0.3)"], "python",
+                     RestartPolicy("always", backoff_base=0.05, min_uptime=0.2, crash_limit=2))
+    wait_for(lambda: event_names(manager, "flapping").count("exited") >= 4)
+    assert "crash_loop" not in event_names(manager, "flapping") and manager.task_info("flapping")["failures"] <= 1
+    manager.remove_task("flapping")
+
+
+def test_terminate_all_deadline(count=50, timeout=2.0):
+    """50 个收到 SIGTERM 后仍要过一会儿才退出的子进程，并行关闭的总耗时受截止时间约束，且不留僵尸进程"""
+    processes = [subprocess.Popen([sys.executable, "-c", slow_script(i)], stdout=subprocess.PIPE, text=True) for i in range(count)]
+    for process in processes:
+        process.stdout.readline()# 等信号处理函数装好
+    result = terminate_all(processes, timeout)
+    assert result["elapsed"] < timeout + 1.0
+    assert all(process.returncode is not None for process in processes)
+    for process in processes:
+        process.stdout.close()
+
+
+def test_stop_all_deadline(manager, count=50, timeout=2.0):
+    for i in range(count):
+        manager.add_task(f"child{i}", ["-c", slow_script(i)], "python")
+    wait_for(lambda: all(len(manager.task_log(f"child{i}")) for i in range(count)))# 都输出了 ready，信号处理函数已装好
+    start = time.monotonic()
+    manager.stop_all(timeout)
+    assert time.monotonic() - start < timeout + 1.0
+    assert all(info["status"] == "stopped" for info in manager.tasks())
+
+
+def test_add_remove_during_broadcast(manager):
+    """广播路由遍历任务表时，其他线程同时增删任务不会打断发送方的输出读取，发送方的退出照常记录"""
+    sender = "import sys\nfor i in range(20000): sys.stdout.write('[CMD:*:ping %d]\\n' % i)\nsys.stdout.flush()\n"
+    manager.add_task("sender", ["-c", sender], "python")
+    for i in range(20):
+        manager.add_task(f"sink{i}", ["-c", "import sys\nfor line in sys.stdin: pass"], "python")
+        if i % 2:
+            manager.remove_task(f"sink{i - 1}")
+    wait_for(lambda: "exited" in event_names(manager, "sender"))
+    assert manager.task_info("sender")["exit_code"] == 0
+    assert manager.bus_stats["routed"] == 20000
@@ -0,0 +1,25 @@
+import random
+
+import pytest
+
+from task.lib.uni_panel.stream_decoder import StreamDecoder
+
+TEXT_LINES = [f"第{i}行 输出：连接成功 → 耗时 {i * 7 % 1000}ms" if i % 3 else f"line {i} ascii only" for i in range(2000)]
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "gbk"])
+def test_random_splits(encoding):
+    """随机切分的中文字节流（含 \\r\\n）逐块解码的结果与整体解码一致，并检测出编码"""
+    payload = "\r\n".join(TEXT_LINES).encode(encoding) + b"\n"
+    for _ in range(200):
+        decoder = StreamDecoder(fallback="gbk")
+        lines = []
+        position = 0
+        while position < len(payload):
+            size = random.randint(1, 64)
+            lines.extend(decoder.feed(payload[position:position + size]))
+            position += size
+        lines.extend(decoder.flush(final=True))
+        assert lines == TEXT_LINES
+        assert decoder.encoding == encoding
+